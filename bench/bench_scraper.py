@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Scraper benchmark suite on a synthetic corpus (see corpus.py).
+
+Times scrape_file, format_markdown, enrich_with_family, json_grouped and
+end-to-end CLI runs (serial, parallel, warm cache, --from-main) with
+timeit, and stores the results as JSON so runs can be compared:
+
+  python3 bench/bench_scraper.py --out bench/results/base.json
+  python3 bench/bench_scraper.py --compare bench/results/base.json
+
+--compare exits 1 when a benchmark's best time is more than --tolerance
+(default 10%) slower than in the baseline. Corpus flags are those of
+corpus.py; the corpus parameters are stored with the results, and a
+comparison against a different corpus is refused.
+"""
+
+import argparse, json, os, pathlib, platform, statistics, subprocess, sys, tempfile, time, timeit
+
+HERE = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "regex"))
+sys.path.insert(0, str(HERE))
+import scrape_tags_core as st  # noqa: E402
+import corpus  # noqa: E402
+
+SCRAPER = HERE.parent / "regex" / "scrape_tags.py"
+
+def _cli(*argv):
+    cmd = [sys.executable, str(SCRAPER), *argv]
+    return lambda: subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def benchmarks(root, workdir):
+    """name -> zero-argument callable, in run order."""
+    files = st.find_files(root)
+    entries = st.scrape_all(files)
+    registry = dict(st.BUILTIN_REGISTRY)
+    cache = str(pathlib.Path(workdir) / "cache")
+    _cli("--root", str(root), "--cache", cache)()   # warm it once
+    return {
+        "scrape_file": lambda: [st.scrape_file(f) for f in files],
+        "format_markdown": lambda: st.format_markdown(entries),
+        "enrich_with_family": lambda: st.enrich_with_family(entries, registry),
+        "json_grouped": lambda: st.json_grouped(entries, by="tag"),
+        "cli_markdown": _cli("--root", str(root)),
+        "cli_json_raw": _cli("--root", str(root), "--json", "raw"),
+        "cli_jobs_all": _cli("--root", str(root), "--jobs", "0"),
+        "cli_cache_warm": _cli("--root", str(root), "--cache", cache),
+        "cli_from_main": _cli("--from-main", str(pathlib.Path(root) / "main.tex")),
+    }
+
+def run(root, workdir, repeat=5, only=None):
+    results = {}
+    for name, fn in benchmarks(root, workdir).items():
+        if only and name not in only:
+            continue
+        fn()   # warm-up (imports, page cache)
+        times = timeit.repeat(fn, number=1, repeat=repeat)
+        results[name] = {"best": min(times), "median": statistics.median(times), "runs": times}
+        print(f"{name:<20} best {min(times)*1e3:9.2f} ms   median {statistics.median(times)*1e3:9.2f} ms",
+              flush=True)
+    return results
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "-C", str(HERE), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline, tolerance):
+    """Print best-time ratios against baseline; returns the names that regressed."""
+    if report["corpus"] != baseline["corpus"]:
+        sys.exit("[err] baseline was measured on a different corpus; rerun with its corpus flags:\n"
+                 f"  {json.dumps(baseline['corpus'])}")
+    slower = []
+    print(f"\n{'benchmark':<20} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    for name, now in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<20} {'-':>10} {now['best']*1e3:10.2f}")
+            continue
+        ratio = now["best"] / base["best"]
+        flag = "  << slower" if ratio > 1 + tolerance else ""
+        print(f"{name:<20} {base['best']*1e3:10.2f} {now['best']*1e3:10.2f} {ratio:7.2f}{flag}")
+        if flag:
+            slower.append(name)
+    return slower
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the tag scraper on a synthetic corpus")
+    corpus.add_corpus_args(ap)
+    ap.add_argument("--repeat", type=int, default=5, help="Timing repetitions per benchmark")
+    ap.add_argument("--only", default=None, help="Comma list of benchmark names to run")
+    ap.add_argument("--out", default=None, help="Write results JSON here")
+    ap.add_argument("--compare", default=None, metavar="BASE.json", help="Compare against a stored run")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown before --compare fails")
+    ap.add_argument("--keep", default=None, metavar="DIR", help="Generate the corpus here and keep it")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="scrape-bench-") as tmp:
+        root = pathlib.Path(args.keep or pathlib.Path(tmp) / "corpus")
+        params = corpus.generate(root, **corpus.corpus_kwargs(args))
+        print(f"[info] corpus: {params['files']} files, {params['bytes']/1e6:.2f} MB, {params['tags']} tags")
+        only = set(args.only.split(",")) if args.only else None
+        results = run(root, tmp, args.repeat, only)
+
+    report = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "git": _git_rev(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "repeat": args.repeat},
+        "corpus": params,
+        "results": results,
+    }
+    if args.out:
+        out = pathlib.Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"[ok] wrote {out}")
+    if args.compare:
+        baseline = json.loads(pathlib.Path(args.compare).read_text(encoding="utf-8"))
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: single-pass TOKEN_RE tokenizer vs. the original per-line
+loop (HDR_RE / FTR_RE / END_RE / TAG_RE on every line).
+
+Builds one large synthetic section from templates/section.tex-style blocks,
+checks that both scanners agree, then times them.
+
+  python3 bench/bench_tokenizer.py [--blocks 2000] [--repeat 5]
+"""
+
+import argparse, pathlib, sys, timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "regex"))
+import scrape_tags_core as st  # noqa: E402
+
+BLOCK = """\\begin{{SectionHeaderLedger}}{{Block {i}}}
+\\Tag[ONTO]{{SEED}} 2025-08-09 v1.0.{i} — Declared scope and Core terms in lexicon.
+\\Tag[EPI]{{FLOW}}  2025-08-09 v1.0.{i} — Set epiphany beat: orient → inhabit → integrate.
+\\end{{SectionHeaderLedger}}
+
+{prose}
+\\begin{{SectionFooterLedger}}
+\\Tag[ONTO]{{ARC}}   2025-08-09 v1.0.{i} — Opened “Foundations → Architecture → Praxis” arc.
+\\Tag[EPI]{{LIGHT}} 2025-08-09 v1.0.{i} — Clarified reader stance with dual-layer voice cues.
+\\end{{SectionFooterLedger}}
+"""
+
+PARAGRAPH = """\\VoicePara{perspectival}
+\\i{We invite the reader to inhabit a navigable cyberspace}. The work braids \\key{ontology} (what is),
+\\key{epistemology} (how we come to know), and \\key{participation} into a single voice.
+We define \\key{cyberspace} as a governed, traversable manifold in which \\key{agents} enact policies
+with legible context, identity, and consent.
+"""
+
+def synthetic_section(blocks, paragraphs=4):
+    head = "\\Section{MotherTeal}{MotherGlyph}{On Cyberspace and Agentics}\n\n"
+    prose = "\n".join([PARAGRAPH] * paragraphs)
+    return head + "\n".join(BLOCK.format(i=i, prose=prose) for i in range(blocks))
+
+def legacy_scan(text, path):
+    """The per-line scanner scrape_text() used before the combined tokenizer."""
+    entries = []
+    section_title = None
+    in_ledger = False
+    ledger_title = None
+    msec = st.SECTION_RE.search(text)
+    if msec:
+        section_title = msec.group("title")
+    for line in text.splitlines():
+        if not in_ledger:
+            mh = st.HDR_RE.search(line)
+            if mh:
+                in_ledger = True
+                ledger_title = mh.group("title")
+                continue
+            if st.FTR_RE.search(line):
+                in_ledger = True
+                ledger_title = section_title or "(unknown section)"
+                continue
+        else:
+            if st.END_RE.search(line):
+                in_ledger = False
+                ledger_title = None
+                continue
+        mt = st.TAG_RE.search(line)
+        if mt:
+            entries.append({
+                "file": str(path),
+                "section": ledger_title or section_title or "(unknown section)",
+                "layer": (mt.group("layer") or "").upper(),
+                "tag": mt.group("tag").upper(),
+                "date": mt.group("date"),
+                "ver": mt.group("ver"),
+                "note": mt.group("narr").strip(),
+            })
+    return entries
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--blocks", type=int, default=2000, help="Ledger blocks in the synthetic section")
+    ap.add_argument("--paragraphs", type=int, default=4, help="Prose paragraphs between ledgers")
+    ap.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    args = ap.parse_args()
+
+    text = synthetic_section(args.blocks, args.paragraphs)
+    data = text.encode("utf-8")
+    expected = legacy_scan(text, "synthetic.tex")
+    for name, got in (("scrape_text", st.scrape_text(text, "synthetic.tex")),
+                      ("scan_bytes", st.scan_bytes(data, "synthetic.tex"))):
+        if [e.to_dict() for e in got] != expected:
+            sys.exit(f"[err] {name} disagrees with the legacy loop")
+
+    print(f"[info] {len(data)/1e6:.2f} MB, {len(text.splitlines())} lines, {len(expected)} tags")
+    runs = {
+        "legacy per-line loop": lambda: legacy_scan(text, "synthetic.tex"),
+        "tokenizer (str)":      lambda: st.scrape_text(text, "synthetic.tex"),
+        "tokenizer (bytes)":    lambda: st.scan_bytes(data, "synthetic.tex"),
+    }
+    base = None
+    for name, fn in runs.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        base = base or best
+        print(f"{name:<22} {best*1e3:9.2f} ms   x{base/best:5.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Synthetic ledger corpus generator, modeled on templates/section.tex.
+
+Writes a tree of section files (\Section title, header/footer ledgers,
+\VoicePara prose) plus a main.tex that pulls them in through nested
+_index.tex files, so both --root and --from-main scans can be measured.
+
+  python3 bench/corpus.py OUT [--files 200] [--size-kb 16] [--tag-density 0.2]
+                              [--nesting 2] [--ascii] [--seed 0]
+
+--tag-density is the share of lines that are \Tag lines; --nesting is the
+directory (and \input) depth the section files sit at.
+"""
+
+import argparse, json, pathlib, random, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "regex"))
+import scrape_tags_core as st  # noqa: E402
+
+LAYERS = ("ONTO", "EPI", "META")
+UNKNOWN_TAGS = ("DRAFT", "TODO_X", "ECHO")   # a few tags the registry does not know
+NOTES_ASCII = (
+    "Declared scope and Core terms in lexicon.",
+    "Set epiphany beat: orient, inhabit, integrate.",
+    "Bound math operators to narrative semantics.",
+    "Tempered visual density; improved scan path.",
+    "Logged protocol and seeds for reproducibility.",
+)
+NOTES_UNICODE = (
+    "Set epiphany beat: orient → inhabit → integrate.",
+    "Opened “Foundations → Architecture → Praxis” arc.",
+    "Reframed drift Δ as contextual misalignment — not error.",
+    "Mother/Father/Gnome glyph set: α, β, γ blends.",
+    "Cadence for §2–§3 (short–long–long) ✦ résumé naïve.",
+    "共鳴 resonance mapped to ward operators ∿.",
+    "Golden moment: layered voices speak as one ✨.",
+)
+PARAGRAPH = (
+    "\\VoicePara{{{voice}}}\n"
+    "\\i{{We invite the reader to inhabit a navigable cyberspace}}. The work braids "
+    "\\key{{ontology}} (what is), \\key{{epistemology}} (how we come to know), and "
+    "\\key{{participation}} into a single voice. Block {i}.\n"
+)
+VOICES = ("perspectival", "propositional", "procedural", "participatory")
+
+def _tag_line(rng, notes, version):
+    tags = list(st.BUILTIN_REGISTRY)
+    tag = rng.choice(UNKNOWN_TAGS) if rng.random() < 0.02 else rng.choice(tags)
+    layer = rng.choice(LAYERS)
+    pad = " " * rng.randint(1, 4)
+    return f"\\Tag[{layer}]{{{tag}}}{pad}2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} v{version} — {rng.choice(notes)}"
+
+def section_file(rng, title, size_kb=16, tag_density=0.2, unicode_notes=True):
+    """One section's source: ledgers and prose until about size_kb KiB."""
+    notes = NOTES_UNICODE + NOTES_ASCII if unicode_notes else NOTES_ASCII
+    lines = [f"% synthetic section — {title}", f"\\Section{{MotherTeal}}{{MotherGlyph}}{{{title}}}", ""]
+    size, block = 0, 0
+    while size < size_kb * 1024:
+        n_tags = rng.randint(2, 4)
+        # prose lines so that tags make up about tag_density of all lines
+        n_prose = max(0, round(n_tags / max(tag_density, 1e-3)) - n_tags - 2)
+        version = f"1.{rng.randint(0, 3)}.{rng.randint(0, 15)}"
+        header = block % 2 == 0
+        chunk = [f"\\begin{{SectionHeaderLedger}}{{{title} {block}}}" if header
+                 else "\\begin{SectionFooterLedger}"]
+        chunk += [_tag_line(rng, notes, version) for _ in range(n_tags)]
+        chunk.append("\\end{SectionHeaderLedger}" if header else "\\end{SectionFooterLedger}")
+        chunk.append("")
+        while n_prose > 0:
+            para = PARAGRAPH.format(voice=rng.choice(VOICES), i=block).splitlines()[:n_prose]
+            chunk += para
+            n_prose -= len(para)
+        chunk.append("")
+        lines += chunk
+        size += sum(len(ln.encode("utf-8")) + 1 for ln in chunk)
+        block += 1
+    return "\n".join(lines) + "\n"
+
+def generate(out, files=200, size_kb=16, tag_density=0.2, nesting=2, unicode_notes=True, seed=0):
+    """
+    Write the corpus under out and return its parameters plus totals
+    (files, bytes, tags) as a dict.
+    """
+    rng = random.Random(seed)
+    out = pathlib.Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    fanout = max(2, round(files ** (1 / nesting))) if nesting > 0 else files
+    children = {}   # directory -> [input names relative to out]
+    total_bytes = total_tags = 0
+    for k in range(files):
+        parts, rest = [], k
+        for _ in range(nesting):
+            parts.append(f"part{rest % fanout:02d}")
+            rest //= fanout
+        rel = pathlib.Path(*parts, f"sec{k:05d}.tex")
+        text = section_file(rng, f"Synthetic Section {k}", size_kb, tag_density, unicode_notes)
+        (out / rel).parent.mkdir(parents=True, exist_ok=True)
+        (out / rel).write_text(text, encoding="utf-8")
+        total_bytes += len(text.encode("utf-8"))
+        total_tags += text.count("\\Tag[")
+        for depth in range(nesting + 1):
+            parent = pathlib.Path(*parts[:depth])
+            child = rel if depth == nesting else pathlib.Path(*parts[:depth + 1], "_index.tex")
+            children.setdefault(parent, [])
+            if child not in children[parent]:
+                children[parent].append(child)
+    for parent, kids in children.items():
+        index = out / "main.tex" if parent == pathlib.Path() else out / parent / "_index.tex"
+        body = "".join(f"\\input{{{kid.with_suffix('').as_posix()}}}\n" for kid in kids)
+        if index.name == "main.tex":
+            body = "\\documentclass{article}\n\\begin{document}\n" + body + "\\end{document}\n"
+        index.write_text(body, encoding="utf-8")
+    return {"files": files, "size_kb": size_kb, "tag_density": tag_density, "nesting": nesting,
+            "unicode_notes": unicode_notes, "seed": seed, "bytes": total_bytes, "tags": total_tags}
+
+def add_corpus_args(ap):
+    ap.add_argument("--files", type=int, default=200, help="Section files to generate")
+    ap.add_argument("--size-kb", type=int, default=16, help="Approximate size of each file in KiB")
+    ap.add_argument("--tag-density", type=float, default=0.2, help="Share of lines that are \\Tag lines")
+    ap.add_argument("--nesting", type=int, default=2, help="Directory / \\input depth of section files")
+    ap.add_argument("--ascii", action="store_true", help="ASCII-only notes (default mixes in Unicode)")
+    ap.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same corpus)")
+
+def corpus_kwargs(args):
+    return dict(files=args.files, size_kb=args.size_kb, tag_density=args.tag_density,
+                nesting=args.nesting, unicode_notes=not args.ascii, seed=args.seed)
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a synthetic ledger corpus")
+    ap.add_argument("out", help="Output directory")
+    add_corpus_args(ap)
+    args = ap.parse_args()
+    print(json.dumps(generate(args.out, **corpus_kwargs(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3248 @@
+#!/usr/bin/env python3
+"""
+Scrape \Tag[...] {...} ledger lines from .tex sections and emit
+CHANGELOG-ready markdown and/or Engram-ready JSON.
+
+New features:
+- Validates tags against a registry (built-in or --tags-reg TAGS.md).
+- Adds 'family' classification (Structural, Process, Symbolic, Meta, Epiphany).
+- JSON export: --json raw | --json grouped (with --group-by layer|tag|section).
+- Recognizes Epiphany Matrix tags: ARC_CLIMAX, GATE_OPEN, GATE_CLOSE,
+  CORE_REVEAL, SPIRAL_TURN, FORGE_STRIKE.
+- Parallel scan: --jobs N fans files out over a process pool (0 = all cores);
+  output order is identical to the serial run. Batches under
+  PARALLEL_MIN_FILES files or PARALLEL_MIN_BYTES bytes stay serial.
+- Parse cache: --cache DIR keeps per-file results keyed by path + size +
+  mtime (content-hash fallback), so warm runs only re-scrape changed files.
+- Daemon: --serve keeps an in-memory index of --root (in --formats) hot
+  (inotify, polling fallback) and answers queries on --socket; clients
+  given --socket use a live daemon and fall back to a local scan when none
+  answers, or when it refuses a query for another --root/--formats or one
+  that needs a local run (writes, checks, instrumentation). The client
+  side lives in the small scrape_tags.py entry point, so a query is sent
+  before this module is compiled or imported.
+- Bytes-level scanning: files are read (mmap'd when large) as bytes and only
+  lines containing \Tag / \begin{Section / \end{Section are decoded.
+- Single-pass tokenizer: one combined TOKEN_RE.finditer() over the buffer
+  yields header/footer/close/tag tokens for the ledger state machine.
+- Incremental CHANGELOG: --mode incremental appends only entries whose
+  stable ID is not yet in the '<outfile>.ids' sidecar, under their group.
+- Streaming JSON: --json ndjson writes one compact object per entry as each
+  file is scraped (filters and family applied inline).
+- Filter pushdown: --layer/--tag/--family/--section/--since/--until/--ver-range
+  are checked in the tokenizer before an entry is built; with --cache, files
+  whose summary cannot match are skipped without loading their entries.
+  Dates are validated and zero-padded (2025-8-1 -> 2025-08-01); a partial
+  version covers its series (--ver-range 1.0 = 1.0.0..1.0.*).
+- Markdown groups sort by date and numeric version (1.0.10 > 1.0.9) with a
+  single sort; versions are parsed once per distinct string.
+- Subcommands: `registry compile` writes TAGS.registry.json/.tex, which
+  get_registry() and TAGS.tex load instead of re-parsing TAGS.md.
+  `history [REV]` streams per-commit added/removed entries from git,
+  reading blobs via one `git cat-file --batch` pipe, parsed once per SHA.
+  `snapshot take|restore|compact|list` keeps engram telemetry as deltas
+  against the previous snapshot, with periodic full checkpoints.
+  `diff A B` hash-joins two engrams (JSON, NDJSON, scraped tree or @TS
+  snapshot) into added/removed/modified entries, holding only A in memory.
+- --check validates tags only (no formatting): exit 1 with file:line:col
+  diagnostics on the first unknown tag (--all: every one); with --cache,
+  unchanged files are checked from their stored tag summary.
+- --files-from FILE|- scrapes a given file list; --staged scrapes the index
+  contents of changed .tex files (git diff --cached), e.g. in a pre-commit
+  hook: `scrape_tags.py --staged --check --all --tags-reg TAGS.md`.
+- --from-main main.tex follows the \input/\include graph (cycle-safe, with
+  \input@path / --tex-path search dirs) and scrapes reachable files in
+  document order; with --cache, unchanged files' includes are not re-read.
+- `ledger` prints every SectionHeaderLedger/SectionFooterLedger block
+  (text, JSON or NDJSON) in one tokenizer pass per file, parallel/cached
+  like the main scan; it replaces the find+awk `make ledger` target.
+- --formats tex,sty,make,latexmkrc,md,shebang (or all) also scrapes ledgers
+  from .sty, Makefile, latexmkrc, '#!' scripts (comment prefix stripped)
+  and CHANGELOG.md '**Tags**:' bullets; files without \Tag cost one
+  substring search.
+- --timings [N] reports per-phase wall/CPU time (discover, scan, registry,
+  filter, enrich, format, write), bytes/lines/tags and the N slowest
+  files; --profile FILE writes cProfile stats.
+- --metrics-out PATH.prom writes the same counters (files scanned, cache
+  hit ratio, tags per family, unknown tags, scan-time histogram) as a
+  node-exporter textfile; --serve --metrics-port PORT serves them live,
+  with the lifetime totals as _total counters.
+- --db engram.sqlite upserts entries by stable ID into an indexed SQLite
+  engram (an unfiltered --root/--from-main scan also drops the rows of
+  deleted files); `query --db engram.sqlite [filters] [--count-by FIELD]`
+  reads it back without rescanning.
+- The --db engram carries an inverted index of the notes (Unicode-folded
+  tokens, positions), updated per new/removed entry; `search "drift
+  misalignment"` ranks matches with BM25 ("quoted" = phrase).
+- `analyze` builds tag co-occurrence (per ledger block, section or file),
+  version x tag histograms and family/layer/tag transition matrices over
+  an interned vocabulary (NumPy when installed), as CSV, JSON or pgfplots
+  tables.
+"""
+
+import argparse, pathlib, re, sys, json, os, hashlib, mmap, sqlite3
+import codecs, csv, difflib, functools, signal, struct, subprocess
+import contextlib, datetime, heapq, math, threading, time, unicodedata
+from collections import Counter, defaultdict
+from itertools import accumulate, chain, groupby
+from operator import attrgetter
+
+numpy = None   # imported by analyze_entries() when installed (see _load_numpy)
+
+# ----------- Tag parsing -----------
+TAG_RE = re.compile(
+    r"""
+    \\Tag
+    (?:\[(?P<layer>[A-Za-z]+)\])?          # optional [ONTO] or [EPI]
+    \{(?P<tag>[A-Za-z0-9_~∿\-]+)\}         # tag name
+    \s+(?P<date>\d{4}-\d{2}-\d{2})         # YYYY-MM-DD
+    \s+v(?P<ver>\d+\.\d+\.\d+)             # vX.Y.Z
+    \s+—\s+(?P<narr>.+)                    # narrative note
+    """, re.VERBOSE
+)
+
+HDR_RE = re.compile(r"""\\begin\{SectionHeaderLedger\}\{(?P<title>.+?)\}""")
+FTR_RE = re.compile(r"""\\begin\{SectionFooterLedger\}""")
+END_RE = re.compile(r"""\\end\{Section(?:Header|Footer)Ledger\}""")
+SECTION_RE = re.compile(r"""\\Section(?:\[[^\]]*\])?\{[^}]*\}\{[^}]*\}\{(?P<title>[^}]+)\}""")
+
+# ----------- Entry record -----------
+class Entry:
+    """
+    One scraped ledger line. Slotted, with interned strings, so large
+    engrams stay compact; 'family' is attached later by enrich_with_family().
+    'ver_key' is the version parsed once into an int tuple for sorting;
+    'block' is the ordinal of the file's ledger block holding the line
+    (None when the source does not say), used to group co-occurrence.
+    Serializers convert to the JSON shape with to_dict() at output time.
+    """
+    FIELDS = ("file", "section", "layer", "tag", "date", "ver", "note")
+    __slots__ = FIELDS + ("family", "ver_key", "block")
+
+    def __init__(self, file, section, layer, tag, date, ver, note, family=None, block=None):
+        intern = sys.intern
+        self.file = intern(file)
+        self.section = intern(section)
+        self.layer = intern(layer)       # ONTO / EPI / ""
+        self.tag = intern(tag)           # e.g., SEED, GLYPH, FLOW, ARC_CLIMAX
+        self.date = intern(date)
+        self.ver = intern(ver)
+        self.ver_key = ver_key(ver)
+        self.note = note
+        self.family = intern(family) if family else None
+        self.block = block
+
+    def fields(self):
+        return (self.file, self.section, self.layer, self.tag, self.date, self.ver, self.note)
+
+    def to_dict(self):
+        d = dict(zip(self.FIELDS, self.fields()))
+        if self.family is not None:
+            d["family"] = self.family
+        return d
+
+    def __reduce__(self):   # compact pickling for the --jobs pool
+        return (Entry, self.fields() + (self.family, self.block))
+
+    def __eq__(self, other):
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return self.fields() == other.fields() and self.family == other.family
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Entry({self.to_dict()!r})"
+
+# ----------- Timings (--timings / --profile) -----------
+class PhaseTimer:
+    """
+    Wall and CPU time per named phase (accumulated over repeats; exclusive,
+    so a phase nested in another is not counted twice) plus
+    per-file scan stats, kept as running totals, a scan-time histogram and
+    the `keep` slowest files so a long-lived daemon's timer stays small.
+    Installed as the module-level _timer by --timings; phase() is a no-op
+    context otherwise.
+    """
+
+    SCAN_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+    def __init__(self, keep=10):
+        self.phases = {}   # name -> [wall, cpu], in first-seen order
+        self.keep = keep
+        self.slowest = []  # min-heap of the keep slowest (seconds, bytes, lines, tags, path)
+        self.scanned = self.bytes = self.lines = self.tags = 0
+        self.scan_seconds = 0.0
+        self.buckets = [0] * len(self.SCAN_BUCKETS)
+        self.cached = 0
+        self.families = Counter()   # entries per family in the last enrichment
+        self.unknown = 0            # distinct unknown tags in the last enrichment
+        self.lock = threading.Lock()   # the daemon records from watcher and query threads
+        self.local = threading.local()  # per-thread stack of open phases
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append([0.0, 0.0])   # wall/cpu of phases nested in this one
+        w0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - w0, time.process_time() - c0
+            nested = stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            with self.lock:
+                acc = self.phases.setdefault(name, [0.0, 0.0])
+                acc[0] += wall - nested[0]
+                acc[1] += cpu - nested[1]
+
+    def file(self, path, stats, stamp, tags):
+        """Record one parsed file from _scrape_record(stats=...) output."""
+        if not stamp:
+            return
+        seconds = stats["seconds"]
+        with self.lock:
+            self.scanned += 1
+            self.bytes += stamp[0]
+            self.lines += stats["lines"]
+            self.tags += tags
+            self.scan_seconds += seconds
+            for i, le in enumerate(self.SCAN_BUCKETS):
+                if seconds <= le:
+                    self.buckets[i] += 1
+                    break
+            if self.keep:
+                record = (seconds, stamp[0], stats["lines"], tags, str(path))
+                if len(self.slowest) < self.keep:
+                    heapq.heappush(self.slowest, record)
+                else:
+                    heapq.heappushpop(self.slowest, record)
+
+    def tagged(self, families, unknowns):
+        self.families, self.unknown = families, len(unknowns)
+
+    def prometheus(self, wall=None, counters=False):
+        """
+        Prometheus text exposition (0.0.4) of the values collected so far.
+        A textfile is rewritten per run, so the totals are gauges; a daemon's
+        totals grow for its lifetime, so with counters they are `_total` counters.
+        """
+        lines = []
+        total_kind, total_suffix = ("counter", "_total") if counters else ("gauge", "")
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP scrape_tags_{name} {help}")
+            lines.append(f"# TYPE scrape_tags_{name} {kind}")
+            for suffix, labels, value in samples:
+                lab = ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels)
+                lines.append(f"scrape_tags_{name}{suffix}{{{lab}}} {value}" if lab
+                             else f"scrape_tags_{name}{suffix} {value}")
+
+        with self.lock:
+            scanned, cumulative = self.scanned, list(accumulate(self.buckets))
+            totals = (self.bytes, self.lines, self.tags, self.scan_seconds)
+        metric("files_scanned" + total_suffix, total_kind, "Files parsed (cache misses).", [("", (), scanned)])
+        metric("files_cached" + total_suffix, total_kind, "Files served from the parse cache.", [("", (), self.cached)])
+        total = scanned + self.cached
+        metric("cache_hit_ratio", "gauge", "Cached share of files looked up.",
+               [("", (), round(self.cached / total, 6) if total else 0)])
+        metric("bytes_read" + total_suffix, total_kind, "Bytes of source parsed.", [("", (), totals[0])])
+        metric("lines_scanned" + total_suffix, total_kind, "Lines of source parsed.", [("", (), totals[1])])
+        metric("tags_matched" + total_suffix, total_kind, "Ledger entries found in parsed files.", [("", (), totals[2])])
+        metric("tags", "gauge", "Ledger entries per tag family.",
+               [("", (("family", fam),), n) for fam, n in sorted(self.families.items())])
+        metric("unknown_tags", "gauge", "Distinct tags missing from the registry.", [("", (), self.unknown)])
+        buckets = [("_bucket", (("le", repr(le)),), n) for le, n in zip(self.SCAN_BUCKETS, cumulative)]
+        buckets.append(("_bucket", (("le", "+Inf"),), scanned))
+        metric("file_scan_seconds", "histogram", "Per-file parse time.",
+               buckets + [("_sum", (), round(totals[3], 6)), ("_count", (), scanned)])
+        metric("phase_seconds" + total_suffix, total_kind, "Wall time spent per phase.",
+               [("", (("phase", name),), round(wall_cpu[0], 6)) for name, wall_cpu in self.phases.items()])
+        if wall is not None:
+            metric("run_seconds", "gauge", "Wall time of the last run.", [("", (), round(wall, 6))])
+            metric("last_run_timestamp_seconds", "gauge", "Unix time the last run finished.",
+                   [("", (), round(time.time(), 3))])
+        return "\n".join(lines) + "\n"
+
+    def report(self, total_wall, total_cpu, top=10, out=None):
+        out = out or sys.stderr
+        out.write(f"[timings] {'phase':<12} {'wall ms':>10} {'cpu ms':>10}   (excluding nested phases)\n")
+        for name, (wall, cpu) in self.phases.items():
+            out.write(f"[timings] {name:<12} {wall*1e3:10.2f} {cpu*1e3:10.2f}\n")
+        out.write(f"[timings] {'total':<12} {total_wall*1e3:10.2f} {total_cpu*1e3:10.2f}"
+                  "   (cpu: this process; --jobs workers not included)\n")
+        out.write(f"[timings] files {self.scanned + self.cached} (scanned {self.scanned}, "
+                  f"cached {self.cached}), bytes read {self.bytes}, "
+                  f"lines scanned {self.lines}, tags matched {self.tags}\n")
+        if top and self.slowest:
+            out.write(f"[timings] slowest {min(top, len(self.slowest))} files:\n")
+            for seconds, size, lines, tags, path in sorted(self.slowest, reverse=True)[:top]:
+                out.write(f"[timings]   {seconds*1e3:8.2f} ms {size:>10} B {lines:>7} lines "
+                          f"{tags:>5} tags  {path}\n")
+
+_timer = None
+
+def _prom_escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def write_metrics(path, text):
+    """Atomically replace a node-exporter textfile (.prom) with text."""
+    tmp = f"{path}.tmp"   # node-exporter only reads *.prom, so the temp file is never half-read
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+
+def phase(name):
+    """Time a block as phase `name` when --timings is on."""
+    return _timer.phase(name) if _timer else contextlib.nullcontext()
+
+# ----------- Scan filters -----------
+def parse_ver(ver):
+    """'1.0.10' -> (1, 0, 10), so versions compare numerically."""
+    return tuple(int(x) for x in ver.split("."))
+
+# entries share one tuple per distinct version string
+ver_key = functools.lru_cache(maxsize=None)(parse_ver)
+
+VER_MAX = 2 ** 63 - 1   # fills the missing parts of a partial upper bound (fits an SQLite INTEGER)
+VER_PART_RE = re.compile(r"\d+(?:\.\d+){0,2}")
+
+def _ver_bound(spec, fill):
+    """'1', '1.0', '1.0.x' or '1.0.4' -> 3-tuple, missing parts set to fill; ValueError otherwise."""
+    spec = spec.strip().lstrip("v")
+    while spec.endswith((".x", ".*")):
+        spec = spec[:-2]
+    if not VER_PART_RE.fullmatch(spec):
+        raise ValueError(f"invalid version {spec!r} (expected X.Y.Z, X.Y or X)")
+    parts = parse_ver(spec)
+    return parts + (fill,) * (3 - len(parts))
+
+def parse_ver_range(spec):
+    """
+    'LO:HI' (either side optional, inclusive) or a single version -> (lo, hi)
+    tuples. Partial versions cover their whole series: '1.0' alone, or as
+    HI, includes 1.0.10. ValueError on anything else.
+    """
+    if not spec:
+        return None, None
+    lo, sep, hi = spec.partition(":")
+    if not sep:
+        hi = lo
+    lo, hi = lo.strip(), hi.strip()
+    if not (lo or hi):
+        raise ValueError(f"empty version range {spec!r}")
+    lo, hi = (_ver_bound(lo, 0) if lo else None), (_ver_bound(hi, VER_MAX) if hi else None)
+    if lo and hi and lo > hi:
+        raise ValueError(f"empty version range {spec!r} (low end above high end)")
+    return lo, hi
+
+def ver_range_arg(spec):
+    """argparse type for --ver-range: the spec, checked by parse_ver_range()."""
+    try:
+        parse_ver_range(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return spec
+
+def date_arg(spec):
+    """argparse type for --since/--until: a real calendar date, normalised to YYYY-MM-DD."""
+    m = re.fullmatch(r"(\d{4})-(\d{1,2})-(\d{1,2})", spec.strip())
+    try:
+        if m is None:
+            raise ValueError
+        return datetime.date(*map(int, m.groups())).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {spec!r} (expected YYYY-MM-DD)")
+
+class ScanFilter:
+    """
+    Entry predicates pushed down into the scanner: --layer, --tag, --family,
+    --section (case-insensitive substring), --since/--until (inclusive
+    YYYY-MM-DD) and --ver-range. Tags that fail are dropped before an Entry
+    is built; cache summaries let whole files be skipped.
+    """
+
+    def __init__(self, layer=None, tag=None, family=None, section=None,
+                 since=None, until=None, ver_range=None, registry=None):
+        self.layer = layer.upper() if layer else None
+        self.tag = tag.upper() if tag else None
+        self.family = family.lower() if family else None
+        self.section = section.lower() if section else None
+        self.since = since
+        self.until = until
+        self.ver_lo, self.ver_hi = parse_ver_range(ver_range)
+        self.registry = registry or {}
+
+    @classmethod
+    def from_args(cls, args, registry=None):
+        """ScanFilter for the CLI filters, or None when nothing is filtered."""
+        opts = dict(layer=args.layer, tag=args.tag, family=args.family, section=args.section,
+                    since=args.since, until=args.until, ver_range=args.ver_range)
+        if not any(opts.values()):
+            return None
+        if args.family and registry is None:
+            registry = get_registry(args)
+        return cls(registry=registry, **opts)
+
+    def _family_of(self, tag):
+        return (self.registry.get(tag) or "Unknown").lower()
+
+    def accepts(self, section, layer, tag, date, ver):
+        if self.layer is not None and layer != self.layer:
+            return False
+        if self.tag is not None and tag != self.tag:
+            return False
+        if self.since and date < self.since:
+            return False
+        if self.until and date > self.until:
+            return False
+        if self.ver_lo or self.ver_hi:
+            v = ver_key(ver)
+            if (self.ver_lo and v < self.ver_lo) or (self.ver_hi and v > self.ver_hi):
+                return False
+        if self.family is not None and self._family_of(tag) != self.family:
+            return False
+        if self.section is not None and self.section not in section.lower():
+            return False
+        return True
+
+    def __call__(self, e):
+        return self.accepts(e.section, e.layer, e.tag, e.date, e.ver)
+
+    def could_match(self, summary):
+        """False when a file's cache summary proves none of its entries can pass."""
+        tags, layers, (dmin, dmax) = summary["tags"], summary["layers"], summary["dates"]
+        if not tags:
+            return False
+        if self.tag is not None and self.tag not in tags:
+            return False
+        if self.layer is not None and self.layer not in layers:
+            return False
+        if self.since and dmax < self.since:
+            return False
+        if self.until and dmin > self.until:
+            return False
+        if self.family is not None and not any(self._family_of(t) == self.family for t in tags):
+            return False
+        return True
+
+# ----------- Built-in registry (fallback) -----------
+# Families
+STRUCTURAL = "Structural"
+PROCESS    = "Process"
+SYMBOLIC   = "Symbolic"
+META       = "Meta"
+EPIPHANY   = "Epiphany"
+
+BUILTIN_REGISTRY = {
+    # 1) Structural & Framework
+    "GLYPH": STRUCTURAL, "NODE": STRUCTURAL, "ARC": STRUCTURAL, "LATTICE": STRUCTURAL,
+    "CORE": STRUCTURAL, "GATE": STRUCTURAL, "BOND": STRUCTURAL, "SEED": STRUCTURAL,
+    "SPINE": STRUCTURAL, "KEY": STRUCTURAL,
+    # 2) Process & Development
+    "DRIFT": PROCESS, "ANCHOR": PROCESS, "FUSE": PROCESS, "REFRACT": PROCESS,
+    "SPIRAL": PROCESS, "TEMPER": PROCESS, "CAST": PROCESS, "WARD": PROCESS,
+    "TRACE": PROCESS, "FLOW": PROCESS, "BIND": PROCESS,
+    # 3) Symbolic & Philosophical
+    "LIGHT": SYMBOLIC, "SHDW": SYMBOLIC, "MOTHER": SYMBOLIC, "FATHER": SYMBOLIC,
+    "AIR": SYMBOLIC, "FIRE": SYMBOLIC, "WATER": SYMBOLIC, "EARTH": SYMBOLIC,
+    "GNOME": SYMBOLIC, "OPAL": SYMBOLIC, "COMPASS": SYMBOLIC, "LAMP": SYMBOLIC, "FORGE": SYMBOLIC,
+    # 4) Meta & Operational
+    "META": META, "ENGRAM": META, "LEDGER": META, "TEST": META, "PROOF": META,
+    "CIPHER": META, "MAP": META, "GLOSS": META, "ARCHIVE": META, "ITER": META,
+    # Epiphany Matrix (Appendix A)
+    "ARC_CLIMAX": EPIPHANY, "GATE_OPEN": EPIPHANY, "GATE_CLOSE": EPIPHANY,
+    "CORE_REVEAL": EPIPHANY, "SPIRAL_TURN": EPIPHANY, "FORGE_STRIKE": EPIPHANY,
+}
+
+def load_registry_from_md(path: pathlib.Path):
+    """
+    Best-effort TAGS.md parser:
+    - Collects UPPERCASE tokens at start of table rows or description bullets.
+    - Also captures Epiphany Matrix items like ARC_CLIMAX.
+    Unknowns default to None family; caller will fall back to BUILTIN_REGISTRY.
+    """
+    tag_to_family = {}
+    current_family = None
+    family_map = {
+        "Structural": STRUCTURAL, "Framework": STRUCTURAL,
+        "Process": PROCESS, "Development": PROCESS,
+        "Symbolic": SYMBOLIC, "Philosophical": SYMBOLIC,
+        "Meta": META, "Operational": META,
+        "Seeded Epiphany Matrix": EPIPHANY, "Epiphany": EPIPHANY
+    }
+    try:
+        text = path.read_text(encoding="utf-8")
+    except Exception as e:
+        sys.stderr.write(f"[warn] could not read TAGS registry {path}: {e}\n")
+        return {}
+
+    # Roughly infer which family section we're in from headings
+    for line in text.splitlines():
+        h = line.strip()
+        if h.startswith("## "):  # family header
+            for key, fam in family_map.items():
+                if key in h:
+                    current_family = fam
+                    break
+            continue
+
+        # Table-style row: | TAG | ...
+        m_tbl = re.match(r"^\|\s*([A-Z][A-Z0-9_]+)\s*\|", h)
+        if m_tbl and current_family:
+            tag = m_tbl.group(1).upper()
+            tag_to_family[tag] = current_family
+            continue
+
+        # Description-style bullet: \item[TAG]
+        m_desc = re.search(r"\[(?P<tag>[A-Z][A-Z0-9_]+)\]", h)
+        if m_desc and current_family:
+            tag_to_family[m_desc.group("tag").upper()] = current_family
+            continue
+
+    return tag_to_family
+
+def get_registry(args):
+    reg = dict(BUILTIN_REGISTRY)
+    if args.tags_reg:
+        with phase("registry"):
+            md_path = pathlib.Path(args.tags_reg)
+            md_map = load_compiled_registry(md_path)
+            if md_map is None:
+                md_map = load_registry_from_md(md_path)
+            # overlay: prefer MD file entries
+            reg.update(md_map)
+    return reg
+
+# ----------- Compiled registry artifact -----------
+# `scrape_tags.py registry compile` turns TAGS.md into TAGS.registry.json
+# (read by get_registry) and TAGS.registry.tex (read by
+# \LoadTagsFromRegistry in TAGS.tex), both stamped with TAGS.md's md5 so
+# either side can tell when the markdown changed.
+REGISTRY_FORMAT = 1
+TEX_HEADING_RE = re.compile(r"^\s*##\s+(.+)\s*$")
+TEX_ROW_RE = re.compile(r"^\|\s*([A-Z][A-Z0-9_]+)\s*\|")
+TEX_BULLET_RE = re.compile(r"\[([A-Z][A-Z0-9_]+)\]")
+
+def registry_artifact_paths(md_path):
+    md_path = pathlib.Path(md_path)
+    return md_path.with_suffix(".registry.json"), md_path.with_suffix(".registry.tex")
+
+def _md5_of(path):
+    return hashlib.md5(pathlib.Path(path).read_bytes()).hexdigest()
+
+def load_compiled_registry(md_path):
+    """Family map from the compiled artifact if it matches md_path's content, else None."""
+    art, _ = registry_artifact_paths(md_path)
+    try:
+        data = json.loads(art.read_text(encoding="utf-8"))
+        if data.get("format") != REGISTRY_FORMAT or data.get("md5") != _md5_of(md_path):
+            return None
+    except (OSError, ValueError):
+        return None
+    return data["families"]
+
+def tex_registry_pairs(text):
+    """
+    (TAG, heading) pairs exactly as the Lua loader in TAGS.tex reads them:
+    the raw '## ' heading is the family, table rows win over [TAG] bullets,
+    and the first occurrence of a tag is kept.
+    """
+    pairs, seen = [], set()
+    family = "Uncategorized"
+    for line in text.splitlines():
+        mh = TEX_HEADING_RE.match(line)
+        if mh:
+            family = mh.group(1)
+        mt = TEX_ROW_RE.match(line) or TEX_BULLET_RE.search(line)
+        if mt and mt.group(1) not in seen:
+            seen.add(mt.group(1))
+            pairs.append((mt.group(1), family))
+    return pairs
+
+def compile_registry(md_path, force=False):
+    """
+    Write the JSON and .tex registry artifacts for md_path.
+    Returns False when both are already current (same md5) and not forced.
+    """
+    md_path = pathlib.Path(md_path)
+    art_json, art_tex = registry_artifact_paths(md_path)
+    digest = _md5_of(md_path)
+    if not force and art_tex.exists() and load_compiled_registry(md_path) is not None:
+        return False
+
+    artifact = {
+        "format": REGISTRY_FORMAT,
+        "source": md_path.name,
+        "md5": digest,
+        "families": load_registry_from_md(md_path),
+        "tex": tex_registry_pairs(md_path.read_text(encoding="utf-8")),
+    }
+    tex = [f"% md5: {digest} — generated from {md_path.name} by scrape_tags.py registry compile",
+           "\\ExplSyntaxOn"]
+    # values are emitted verbatim, exactly as the Lua loader passes them
+    tex += [f"\\tags_register_pair:nn{{{tag}}}{{{fam}}}" for tag, fam in artifact["tex"]]
+    tex.append("\\ExplSyntaxOff")
+
+    for path, text in ((art_json, json.dumps(artifact, indent=2, ensure_ascii=False) + "\n"),
+                       (art_tex, "\n".join(tex) + "\n")):
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    return True
+
+def cmd_registry(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py registry",
+                                 description="Manage the compiled tag registry artifact")
+    sub = ap.add_subparsers(dest="action", required=True)
+    c = sub.add_parser("compile", help="Compile TAGS.md into TAGS.registry.json/.tex (skipped if unchanged)")
+    c.add_argument("--tags-reg", default="TAGS.md", help="Path to TAGS.md")
+    c.add_argument("--force", action="store_true", help="Rebuild even if TAGS.md is unchanged")
+    args = ap.parse_args(argv)
+
+    try:
+        built = compile_registry(args.tags_reg, force=args.force)
+    except OSError as e:
+        sys.stderr.write(f"[err] could not compile registry: {e}\n")
+        return 1
+    art_json, art_tex = registry_artifact_paths(args.tags_reg)
+    if built:
+        print(f"[ok] wrote {art_json} and {art_tex}")
+    else:
+        print(f"[ok] registry up to date ({art_json})")
+    return 0
+
+# ----------- Scrape functions -----------
+def skipped_dir(name):
+    """Directories no scan or watch descends into: hidden ones and __pycache__."""
+    return name.startswith(".") or name == "__pycache__"
+
+def find_files(root, formats=("tex",)):
+    """
+    Source files under root (or root itself) in the given formats, sorted;
+    whatever the formats, hidden and __pycache__ directories are skipped.
+    """
+    p = pathlib.Path(root)
+    if not p.is_dir():
+        return [p] if scanner_for(p, formats) else []
+    found = []
+    for dirpath, dirnames, filenames in os.walk(p):
+        dirnames[:] = [d for d in dirnames if not skipped_dir(d)]
+        d = pathlib.Path(dirpath)
+        found.extend(d / n for n in filenames
+                     if (not n.startswith(".") or n in SCANNERS["latexmkrc"].names)
+                     and scanner_for(d / n, formats))
+    return sorted(found)
+
+# ----------- Include graph (--from-main) -----------
+INCLUDE_RE = re.compile(
+    r"""
+    \\(?:
+        (?:input|include|subfile|InputIfFileExists)\s*\{(?P<name>[^{}\#"]+)\}
+      | (?P<imp>import|subimport|includefrom|subincludefrom)\s*
+        \{(?P<dir>[^{}\#]*)\}\s*\{(?P<iname>[^{}\#"]+)\}
+      | input\s+(?P<bare>[^\s{}\\%#]+)
+    )
+    """, re.VERBOSE
+)
+INPUT_PATH_RE = re.compile(r"\\def\\input@path\s*\{(?P<dirs>(?:\s*\{[^{}]*\})*)\s*\}")
+TEX_COMMENT_RE = re.compile(r"(?<!\\)%.*")
+
+def scan_includes(text):
+    """
+    The include references in a .tex source, comments stripped:
+    ([(kind, dir, name), ...], [input@path dirs]) where kind is "" for
+    \input/\include, "import" (dir relative to the main file) or
+    "subimport" (dir relative to the including file).
+    """
+    text = TEX_COMMENT_RE.sub("", text)
+    refs = []
+    for m in INCLUDE_RE.finditer(text):
+        if m.group("imp"):
+            kind = "subimport" if m.group("imp").startswith("sub") else "import"
+            refs.append((kind, m.group("dir").strip(), m.group("iname").strip()))
+        else:
+            refs.append(("", "", (m.group("name") or m.group("bare")).strip()))
+    input_path = [d for mp in INPUT_PATH_RE.finditer(text)
+                  for d in re.findall(r"\{([^{}]*)\}", mp.group("dirs"))]
+    return refs, input_path
+
+def _resolve_tex(name, dirs):
+    """First existing dir/name (or dir/name.tex) over dirs, normalized, else None."""
+    cands = (name,) if pathlib.PurePath(name).suffix else (name + ".tex", name)
+    for d in dirs:
+        for cand in cands:
+            p = pathlib.Path(os.path.normpath(d / cand))
+            if p.is_file():
+                return p
+    return None
+
+def find_from_main(main, search_paths=(), cache=None):
+    """
+    The .tex files reachable from main through \input / \include / \subfile /
+    \import, in document (depth-first, first-visit) order. Names resolve
+    against main's directory, then \input@path entries seen so far, then
+    search_paths (like \graphicspath / TEXINPUTS). Cycles are reported and
+    cut; files included twice are listed once. With a cache, the references
+    of unchanged files come from its include table without reading them.
+    """
+    main = pathlib.Path(main)
+    base = main.parent
+    dirs = [base] + [pathlib.Path(d) for d in search_paths]
+    order, done, stack = [], set(), []
+
+    def visit(path):
+        if path in stack:
+            cycle = " -> ".join(map(str, stack[stack.index(path):] + [path]))
+            sys.stderr.write(f"[warn] include cycle: {cycle}\n")
+            return
+        if path in done:
+            return
+        done.add(path)
+        order.append(path)
+        cached = cache.get_aux(path, "includes") if cache else None
+        if cached is None:
+            try:
+                text = path.read_text(encoding="utf-8", errors="replace")
+            except OSError as e:
+                sys.stderr.write(f"[warn] could not read {path}: {e}\n")
+                return
+            cached = scan_includes(text)
+            if cache:
+                cache.put_aux(path, "includes", cached)
+        refs, input_path = cached
+        refs = [tuple(r) for r in refs]
+        for d in input_path:
+            d = base / d
+            if d not in dirs:
+                dirs.insert(len(dirs) - len(search_paths), d)
+        stack.append(path)
+        for kind, sub, name in refs:
+            if kind:
+                root = (path.parent if kind == "subimport" else base) / sub
+                child = _resolve_tex(name, [root] + dirs)
+            else:
+                child = _resolve_tex(name, dirs)
+            if child is None:
+                sys.stderr.write(f"[warn] {path}: cannot resolve include '{name}'\n")
+            else:
+                visit(child)
+        stack.pop()
+
+    if not main.is_file():
+        sys.stderr.write(f"[warn] main file not found: {main}\n")
+        return []
+    visit(pathlib.Path(os.path.normpath(main)))
+    return [p for p in order if p.suffix == ".tex"]
+
+def read_file_list(src, formats=("tex",)):
+    """The source paths (in formats) listed one per line in src ('-' = stdin), in order, deduplicated."""
+    fh = sys.stdin if src == "-" else open(src, encoding="utf-8")
+    try:
+        names = [ln.strip() for ln in fh]
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+    files = []
+    for name in dict.fromkeys(n for n in names if n):
+        p = pathlib.Path(name)
+        if p.is_file():
+            if not scanner_for(p, formats):
+                continue
+            files.append(p)
+        else:
+            sys.stderr.write(f"[warn] listed file not found: {name}\n")
+    return files
+
+def input_files(args, cache=None):
+    """The .tex files the CLI args select: --files-from, else --from-main, else --root."""
+    with phase("discover"):
+        return _input_files(args, cache)
+
+def _input_files(args, cache=None):
+    if args.files_from:
+        return read_file_list(args.files_from, args.formats)
+    if args.from_main:
+        tex_path = args.tex_path or [d for d in os.environ.get("TEXINPUTS", "").split(os.pathsep) if d]
+        return find_from_main(args.from_main, tex_path, cache)
+    return find_files(args.root, args.formats)
+
+# ----------- Single-pass tokenizer -----------
+# One alternation over the whole buffer instead of four regexes per line.
+# str.splitlines() boundaries are excluded from "inline" classes so tokens
+# never cross a line, exactly like the per-line patterns above.
+_LB = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+_WS = rf"[^\S{_LB}]"
+LINE_END_RE = re.compile(f"[{_LB}]")
+
+TOK_HEADER, TOK_FOOTER, TOK_CLOSE, TOK_TAG = "header", "footer", "close", "tag"
+
+TOKEN_RE = re.compile(
+    rf"""
+    \\(?:                                             # shared prefix keeps the literal scan fast
+      (?P<header>begin\{{SectionHeaderLedger\}}\{{
+          (?=(?P<title>[^{_LB}]+?)\}}))              # title via lookahead: a \Tag inside stays visible
+    | (?P<footer>begin\{{SectionFooterLedger\}})
+    | (?P<close>end\{{Section(?:Header|Footer)Ledger\}})
+    | (?P<tag>Tag
+          (?:\[(?P<layer>[A-Za-z]+)\])?
+          \{{(?P<name>[A-Za-z0-9_~∿\-]+)\}}
+          {_WS}+(?P<date>\d{{4}}-\d{{2}}-\d{{2}})
+          {_WS}+v(?P<ver>\d+\.\d+\.\d+)
+          {_WS}+—
+          (?=(?P<note>{_WS}[^{_LB}]+)))              # note = rest of line, left unconsumed
+    )
+    """, re.VERBOSE
+)
+
+def _line_end(buf, m):
+    if m.lastgroup == TOK_TAG:
+        return m.end("note")
+    lb = LINE_END_RE.search(buf, m.end())
+    return lb.start() if lb else len(buf)
+
+def tokenize(buf):
+    """
+    Yield (kind, match, line_end) for every ledger token in buf, in order.
+    kind is TOK_HEADER, TOK_FOOTER, TOK_CLOSE or TOK_TAG; line_end is the
+    offset of the line break ending the token's line.
+    """
+    for m in TOKEN_RE.finditer(buf):
+        yield m.lastgroup, m, _line_end(buf, m)
+
+def _scan_tokens(buf, path, section_title, flt=None):
+    """
+    Apply the ledger state machine to the token stream, one decision per line:
+    outside a ledger a header (then footer) opens it and ends the line;
+    inside, a close ends it and the line; otherwise the line's first tag
+    becomes an entry, unless the ScanFilter flt rejects it.
+    """
+    entries = []
+    file = str(path)
+    default_title = section_title or "(unknown section)"
+    in_ledger = False
+    ledger_title = None
+    block = 0   # bumped when a ledger opens or closes, so each block (and each gap) gets its own
+    line_end = -1
+    hdr = tag = None
+    ftr = close = False
+
+    # tokenize() inlined: this loop runs once per ledger line on big trees
+    for m in chain(TOKEN_RE.finditer(buf), (None,)):
+        if m is None or m.start() >= line_end:
+            # flush the previous line
+            if not in_ledger and hdr is not None:
+                in_ledger, ledger_title = True, hdr.group("title")
+                block += 1
+            elif not in_ledger and ftr:
+                in_ledger, ledger_title = True, default_title
+                block += 1
+            elif in_ledger and close:
+                in_ledger, ledger_title = False, None
+                block += 1
+            elif tag is not None:
+                layer, name, date, ver = tag.group("layer", "name", "date", "ver")
+                layer, name = (layer or "").upper(), name.upper()
+                section = ledger_title or default_title
+                if flt is None or flt.accepts(section, layer, name, date, ver):
+                    entries.append(Entry(file, section, layer, name, date, ver,
+                                         tag.group("note").strip(), block=block))
+            if m is None:
+                break
+            hdr = tag = None
+            ftr = close = False
+            kind = m.lastgroup
+            if kind == TOK_TAG:   # the common case: a ledger line opening with its tag
+                line_end = m.end("note")
+                tag = m
+                continue
+            line_end = _line_end(buf, m)
+        else:
+            kind = m.lastgroup
+
+        if kind == TOK_TAG:
+            if tag is None:
+                tag = m
+        elif kind == TOK_HEADER:
+            if hdr is None:
+                hdr = m
+        elif kind == TOK_FOOTER:
+            ftr = True
+        else:
+            close = True
+    return entries
+
+def scrape_text(text, path, flt=None):
+    section_title = None
+    msec = SECTION_RE.search(text)
+    if msec:
+        section_title = msec.group("title")
+    return _scan_tokens(text, path, section_title, flt)
+
+# ----------- Bytes-level scanning -----------
+# Every ledger pattern needs one of these markers on its line, so lines
+# without a marker are never decoded or matched.
+MARKER_BRE = re.compile(rb"\\(?:Tag|begin\{Section|end\{Section)")
+MARKER_RUN_BRE = re.compile(rb"(?:[^\n]*?\\(?:Tag|begin\{Section|end\{Section)[^\n]*(?:\n|\Z))+")
+SECTION_BRE = re.compile(SECTION_RE.pattern.encode("ascii"))
+MMAP_MIN = 64 * 1024   # below this a plain read beats mmap setup
+
+def _marker_spans(buf):
+    """
+    Yield decoded runs of consecutive lines that contain a ledger marker, in
+    order. Each run (usually a whole ledger block) is found and decoded in
+    one call, so the Python loop turns once per block rather than per line.
+    """
+    pos = 0
+    while True:
+        m = MARKER_BRE.search(buf, pos)
+        if m is None:
+            return
+        line_start = buf.rfind(b"\n", 0, m.start()) + 1
+        pos = MARKER_RUN_BRE.match(buf, line_start).end()
+        yield buf[line_start:pos].decode("utf-8")
+
+def scan_bytes(buf, path, flt=None):
+    """
+    Scrape a bytes-like buffer (bytes or mmap). Only lines holding a marker
+    are decoded, so cost follows the number of tags rather than file size.
+    """
+    section_title = None
+    msec = SECTION_BRE.search(buf)
+    if msec:
+        section_title = msec.group("title").decode("utf-8")
+    return _scan_tokens("\n".join(_marker_spans(buf)), path, section_title, flt)
+
+# ----------- Source formats -----------
+# Ledger lines also live outside .tex: in Makefile and latexmkrc comment
+# headers, in .sty files and in CHANGELOG.md. Each Scanner claims files by
+# name, suffix or shebang and strips its comment prefix before the usual
+# tokenizer runs; files without a \Tag cost one substring search.
+TAG_NEEDLE = b"\\Tag"
+BARE_HEADER_RE = re.compile(r"\\begin\{SectionHeaderLedger\}(?!\{)")
+MD_GROUP_RE = re.compile(r"^##\s+(?P<date>\d{4}-\d{2}-\d{2})\s+—\s+v(?P<ver>\d+\.\d+\.\d+)\s+—\s+(?P<title>.+?)\s*$")
+MD_TAGS_RE = re.compile(r"^\s*[-*]\s+\*\*Tags\*\*:\s*(?P<tags>.*)$")
+MD_TAG_REF_RE = re.compile(r"\\Tag(?:\[(?P<layer>[A-Za-z]+)\])?\{(?P<tag>[A-Za-z0-9_~∿\-]+)\}")
+
+class Scanner:
+    """
+    Ledger scanner for one source format. 'comment' holds the characters
+    of its line-comment prefix (stripped before tokenizing); a ledger
+    header without a {title} takes the file name.
+    """
+
+    def __init__(self, name, suffixes=(), names=(), comment=""):
+        self.name = name
+        self.suffixes = suffixes
+        self.names = names
+        self.prefix_re = re.compile(rf"(?m)^[ \t]*[{re.escape(comment)}]+[ \t]?") if comment else None
+
+    def claims(self, path):
+        return path.name in self.names or path.suffix in self.suffixes
+
+    def text(self, buf, path):
+        """The file decoded, comment prefixes stripped and bare headers titled."""
+        text = bytes(buf).decode("utf-8")
+        if self.prefix_re is not None:
+            text = self.prefix_re.sub("", text)
+        return BARE_HEADER_RE.sub(lambda m: f"{m.group(0)}{{{pathlib.Path(path).name}}}", text)
+
+    def fallback_title(self, path):
+        """Section of ledger lines when the file has no \\Section title."""
+        return pathlib.Path(path).name
+
+    def scan(self, buf, path, flt=None):
+        if buf.find(TAG_NEEDLE) < 0:
+            return []
+        text = self.text(buf, path)
+        msec = SECTION_RE.search(text)
+        return _scan_tokens(text, path, msec.group("title") if msec else self.fallback_title(path), flt)
+
+class TexScanner(Scanner):
+    def text(self, buf, path):
+        return bytes(buf).decode("utf-8")
+
+    def fallback_title(self, path):
+        return "(unknown section)"
+
+    def scan(self, buf, path, flt=None):
+        if buf.find(TAG_NEEDLE) < 0:
+            return []
+        return scan_bytes(buf, path, flt)
+
+class MarkdownScanner(Scanner):
+    """
+    Ledger blocks anywhere in the file, plus CHANGELOG-style groups:
+    '- **Tags**: \Tag[META]{LEDGER}, ...' bullets under a
+    '## YYYY-MM-DD — vX.Y.Z — Title' heading yield one entry per tag, with
+    the title as section and note.
+    """
+
+    def scan(self, buf, path, flt=None):
+        if buf.find(TAG_NEEDLE) < 0:
+            return []
+        entries = super().scan(buf, path, flt)
+        file = str(path)
+        group = None
+        block = max((e.block for e in entries), default=0)   # each '##' group is a block after the ledgers
+        for line in bytes(buf).decode("utf-8").splitlines():
+            mg = MD_GROUP_RE.match(line)
+            if mg:
+                group = mg.group("date", "ver", "title")
+                block += 1
+                continue
+            mt = MD_TAGS_RE.match(line)
+            if mt is None or group is None:
+                continue
+            date, ver, title = group
+            for ref in MD_TAG_REF_RE.finditer(mt.group("tags")):
+                layer, tag = (ref.group("layer") or "").upper(), ref.group("tag").upper()
+                if flt is None or flt.accepts(title, layer, tag, date, ver):
+                    entries.append(Entry(file, title, layer, tag, date, ver, title, block=block))
+        return entries
+
+SCANNERS = {
+    "tex": TexScanner("tex", suffixes=(".tex",)),
+    "sty": Scanner("sty", suffixes=(".sty", ".cls", ".dtx"), comment="%"),
+    "make": Scanner("make", suffixes=(".mk",), names=("Makefile", "GNUmakefile", "makefile"), comment="#%"),
+    "latexmkrc": Scanner("latexmkrc", names=("latexmkrc", ".latexmkrc"), comment="#"),
+    "md": MarkdownScanner("md", suffixes=(".md",)),
+    "shebang": Scanner("shebang", comment="#"),   # extensionless '#!' scripts
+}
+FORMATS = tuple(SCANNERS)
+
+def scanner_for(path, formats=None, head=None):
+    """
+    The Scanner claiming path among formats (default: all), by name or
+    suffix, then by a '#!' first line for extensionless files; None if
+    no format claims it. head is the file's first bytes when already read.
+    """
+    path = pathlib.Path(path)
+    formats = formats or FORMATS
+    for fmt in formats:
+        if SCANNERS[fmt].claims(path):
+            return SCANNERS[fmt]
+    if "shebang" in formats and not path.suffix:
+        if head is None:
+            try:
+                with open(path, "rb") as fh:
+                    head = fh.read(2)
+            except OSError:
+                return None
+        if bytes(head[:2]) == b"#!":
+            return SCANNERS["shebang"]
+    return None
+
+def scan_source(buf, path, flt=None):
+    """Scrape a file's bytes with the scanner for its format (.tex by default)."""
+    return (scanner_for(path, head=buf[:2]) or SCANNERS["tex"]).scan(buf, path, flt)
+
+def parse_formats(spec):
+    """'tex,sty' / 'all' -> tuple of format names (argparse type)."""
+    names = FORMATS if spec == "all" else tuple(f.strip() for f in spec.split(",") if f.strip())
+    unknown = [f for f in names if f not in SCANNERS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown format(s) {', '.join(unknown)}; choose from {', '.join(FORMATS)}, all")
+    return names
+
+def scrape_file(path: pathlib.Path, flt=None):
+    return _scrape_record(path, flt)[0]
+
+def _scrape_record(path, flt=None, stats=None, want_digest=False):
+    """
+    Scrape one file; returns (entries, stamp) with stamp = (size, mtime_ns, sha1) or None.
+    The sha1 is only computed with want_digest (a cache will store the row),
+    else it is None. A stats dict, when given, receives the scan's seconds and line count.
+    """
+    t0 = time.perf_counter()
+    try:
+        with open(path, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            if st.st_size >= MMAP_MIN:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    entries = scan_source(buf, path, flt)
+                    digest = hashlib.sha1(buf).hexdigest() if want_digest else None
+                    if stats is not None:
+                        stats.update(seconds=time.perf_counter() - t0, lines=buf[:].count(b"\n"))
+            else:
+                buf = fh.read()
+                entries = scan_source(buf, path, flt)
+                digest = hashlib.sha1(buf).hexdigest() if want_digest else None
+                if stats is not None:
+                    stats.update(seconds=time.perf_counter() - t0, lines=buf.count(b"\n"))
+    except (OSError, ValueError) as e:   # ValueError covers UnicodeDecodeError
+        sys.stderr.write(f"[warn] could not read {path}: {e}\n")
+        return [], None
+    return entries, (st.st_size, st.st_mtime_ns, digest)
+
+def _scrape_chunk(paths, flt=None, timed=False, want_digest=False):
+    if not timed:
+        return [_scrape_record(p, flt, want_digest=want_digest) for p in paths]
+    records = []
+    for p in paths:
+        stats = {"seconds": 0.0, "lines": 0}
+        records.append(_scrape_record(p, flt, stats, want_digest) + (stats,))
+    return records
+
+# ----------- Ledger blocks -----------
+def ledger_blocks(text, fallback_title="(unknown section)"):
+    """
+    Every SectionHeaderLedger/SectionFooterLedger block in text, from one
+    tokenize() pass with the same open/close rules as _scan_tokens():
+    [{"kind": "header"|"footer", "title", "line" (1-based), "text"}].
+    An unclosed block runs to the end of the text.
+    """
+    msec = SECTION_RE.search(text)
+    default_title = msec.group("title") if msec else fallback_title
+    blocks = []
+    open_block = None
+    line_no, counted = 1, 0
+    skip_to = -1
+    for kind, m, line_end in tokenize(text):
+        if m.start() < skip_to or kind == TOK_TAG:
+            continue
+        if open_block is None and kind in (TOK_HEADER, TOK_FOOTER):
+            start = text.rfind("\n", 0, m.start()) + 1
+            line_no += text.count("\n", counted, start)
+            counted = start
+            title = m.group("title") if kind == TOK_HEADER else default_title
+            open_block = {"kind": kind, "title": title, "line": line_no, "start": start}
+            skip_to = line_end
+        elif open_block is not None and kind == TOK_CLOSE:
+            open_block["text"] = text[open_block.pop("start"):line_end]
+            blocks.append(open_block)
+            open_block = None
+            skip_to = line_end
+    if open_block is not None:
+        open_block["text"] = text[open_block.pop("start"):].rstrip("\n")
+        blocks.append(open_block)
+    return blocks
+
+def _ledger_record(path):
+    """
+    (blocks, (size, mtime_ns)) for one file, or ([], None) if unreadable;
+    read through its format's Scanner, as the scrape does (comment prefixes
+    stripped, bare headers titled).
+    """
+    try:
+        st = path.stat()
+        data = path.read_bytes()
+        scanner = scanner_for(path, head=data[:2]) or SCANNERS["tex"]
+        blocks = ledger_blocks(scanner.text(data, path), scanner.fallback_title(path))
+        return blocks, (st.st_size, st.st_mtime_ns)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"[warn] could not read {path}: {e}\n")
+        return [], None
+
+def _ledger_chunk(paths):
+    return [_ledger_record(p) for p in paths]
+
+def iter_ledger_files(files, jobs=1, cache=None):
+    """Yield (path, blocks) per file in order; cached files are not re-read."""
+    files = list(files)
+    hits = [cache.get_aux(f, "ledgers") if cache else None for f in files]
+    records, pool = _map_files(_ledger_chunk, [f for f, hit in zip(files, hits) if hit is None], jobs)
+    try:
+        for f, hit in zip(files, hits):
+            if hit is None:
+                hit, stamp = next(records)
+                if cache and stamp:
+                    cache.put_aux(f, "ledgers", hit, stamp)
+            yield f, hit
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+def cmd_ledger(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py ledger",
+                                 description="Print SectionHeaderLedger / SectionFooterLedger blocks")
+    add_input_args(ap)
+    ap.add_argument("--kind", choices=["header", "footer"], default=None, help="Only one kind of ledger")
+    ap.add_argument("--format", choices=["text", "json", "ndjson"], default="text",
+                    help="text: per-file Header/Footer listing; json: one list; ndjson: one block per line")
+    ap.add_argument("--jobs", "-j", type=int, default=1, help="Read files in N worker processes (0 = one per CPU)")
+    ap.add_argument("--cache", default=None, metavar="DIR", help="Persistent parse cache directory")
+    args = ap.parse_args(argv)
+
+    cache = ScrapeCache(args.cache) if args.cache else None
+    kinds = [args.kind] if args.kind else [TOK_HEADER, TOK_FOOTER]
+    every = []
+    try:
+        for f, blocks in iter_ledger_files(input_files(args, cache), args.jobs, cache):
+            blocks = [dict(file=str(f), **b) for b in blocks if b["kind"] in kinds]
+            if args.format == "json":
+                every.extend(blocks)
+            elif args.format == "ndjson":
+                for b in blocks:
+                    print(json.dumps(b, ensure_ascii=False, separators=(",", ":")))
+            else:
+                print("-" * 60)
+                for kind in kinds:
+                    print(f"{f} — {kind.capitalize()} Ledger")
+                    for b in blocks:
+                        if b["kind"] == kind:
+                            print(b["text"])
+                    print()
+    finally:
+        if cache:
+            cache.close()
+    if args.format == "json":
+        print(json.dumps(every, indent=2))
+    return 0
+
+# ----------- Parse cache -----------
+class ScrapeCache:
+    """
+    Persistent parse cache (SQLite under --cache DIR).
+    Rows are keyed by resolved path; a row is reused when size+mtime match,
+    or when the size matches and the content hash still does (touch/checkout).
+    Entries are stored as field arrays without 'file', which is re-attached
+    from the path as given on the command line, next to a small summary
+    (tags, layers, date span) that lets a ScanFilter skip the file unread.
+    """
+    SCHEMA = 5
+
+    def __init__(self, directory):
+        d = pathlib.Path(directory)
+        d.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(d / "scrape.sqlite"))
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+            digest TEXT, entries TEXT, summary TEXT)""")
+        row = self.db.execute("SELECT value FROM meta WHERE key='schema'").fetchone()
+        if not row or row[0] != str(self.SCHEMA):
+            self.db.execute("DROP TABLE files")
+            self.db.execute("DROP TABLE IF EXISTS aux")
+            self.db.execute("""CREATE TABLE files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+                digest TEXT, entries TEXT, summary TEXT)""")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(self.SCHEMA),))
+        self.db.execute("""CREATE TABLE IF NOT EXISTS aux (
+            path TEXT, kind TEXT, size INTEGER, mtime_ns INTEGER, value TEXT,
+            PRIMARY KEY (path, kind))""")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path):
+        return str(pathlib.Path(path).resolve())
+
+    def _fresh_row(self, path, columns):
+        """The requested columns of path's row if it is still valid, else None."""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        key = self._key(path)
+        row = self.db.execute(
+            f"SELECT size, mtime_ns, digest, {columns} FROM files WHERE path=?",
+            (key,)).fetchone()
+        if row is None or row[0] != st.st_size:
+            self.misses += 1
+            return None
+        if row[1] != st.st_mtime_ns:
+            try:
+                digest = hashlib.sha1(path.read_bytes()).hexdigest()
+            except OSError:
+                return None
+            if digest != row[2]:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE files SET mtime_ns=? WHERE path=?", (st.st_mtime_ns, key))
+        self.hits += 1
+        return row[3:]
+
+    def lookup(self, path, flt=None):
+        """
+        Return cached entries for path (only those flt accepts), or None when
+        the file must be re-scraped.
+        """
+        row = self._fresh_row(path, "entries, summary")
+        if row is None:
+            return None
+        if flt is not None and not flt.could_match(json.loads(row[1])):
+            return []
+        file = str(path)
+        entries = [Entry(file, *fields[:6], block=fields[6]) for fields in json.loads(row[0])]
+        return [e for e in entries if flt(e)] if flt is not None else entries
+
+    def get_aux(self, path, kind):
+        """
+        A JSON value cached for path under kind (e.g. "includes", "ledgers"),
+        or None when missing or path's size/mtime changed since it was stored.
+        """
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        row = self.db.execute("SELECT size, mtime_ns, value FROM aux WHERE path=? AND kind=?",
+                              (self._key(path), kind)).fetchone()
+        if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+            return None
+        return json.loads(row[2])
+
+    def put_aux(self, path, kind, value, stamp=None):
+        """Cache value for path under kind; stamp is (size, mtime_ns) when already known."""
+        if stamp is None:
+            try:
+                st = path.stat()
+            except OSError:
+                return
+            stamp = (st.st_size, st.st_mtime_ns)
+        self.db.execute("INSERT OR REPLACE INTO aux VALUES (?, ?, ?, ?, ?)",
+                        (self._key(path), kind, stamp[0], stamp[1],
+                         json.dumps(value, ensure_ascii=False, separators=(",", ":"))))
+
+    def tags(self, path):
+        """The set of tags in path from its summary alone, or None on a miss."""
+        row = self._fresh_row(path, "summary")
+        return None if row is None else set(json.loads(row[0])["tags"])
+
+    def store(self, path, entries, stamp):
+        if stamp is None:
+            return
+        size, mtime_ns, digest = stamp
+        payload = json.dumps([e.fields()[1:] + (e.block,) for e in entries],
+                             ensure_ascii=False, separators=(",", ":"))
+        dates = sorted({e.date for e in entries})
+        summary = json.dumps({"tags": sorted({e.tag for e in entries}),
+                              "layers": sorted({e.layer for e in entries}),
+                              "dates": [dates[0], dates[-1]] if dates else ["", ""]})
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                        (self._key(path), size, mtime_ns, digest, payload, summary))
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+# below either, starting a pool costs more than the parallel scan saves
+PARALLEL_MIN_FILES = 32
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+def _worth_a_pool(todo):
+    """True when todo is big enough (files and bytes) for a process pool to pay off."""
+    if len(todo) < PARALLEL_MIN_FILES:
+        return False
+    size = 0
+    for f in todo:
+        try:
+            size += os.stat(f).st_size
+        except OSError:
+            continue
+        if size >= PARALLEL_MIN_BYTES:
+            return True
+    return False
+
+def _map_files(chunk_fn, todo, jobs=1):
+    """
+    (results, pool): chunk_fn applied over todo, one result per file in
+    order; with jobs > 1 (0 = all CPUs) contiguous chunks run in a
+    process pool, which the caller shuts down (pool is None when serial).
+    Small batches (see _worth_a_pool) always run serially.
+    """
+    if jobs is not None and jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if not jobs or jobs <= 1 or not _worth_a_pool(todo):
+        return chain.from_iterable(chunk_fn([f]) for f in todo), None
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = min(jobs, len(todo))
+    size = max(1, len(todo) // (jobs * 4))   # a few chunks per worker for balance
+    chunks = [todo[k:k + size] for k in range(0, len(todo), size)]
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    return chain.from_iterable(pool.map(chunk_fn, chunks)), pool
+
+def iter_scrape_files(files, jobs=1, cache=None, flt=None):
+    """
+    Yield one entry list per file, in file order, as soon as each is ready.
+    Files with a valid cache row are not read at all. With jobs > 1 the
+    remaining files are split into contiguous chunks and scraped in a process
+    pool; chunks are consumed in submission order, so the result is
+    identical to the serial loop.
+
+    flt (a ScanFilter) is pushed into the tokenizer; with a cache, misses are
+    scraped in full so the stored rows stay complete, then filtered.
+    """
+    files = list(files)
+    hits = [cache.lookup(f, flt) if cache else None for f in files]
+    todo = [f for f, hit in zip(files, hits) if hit is None]
+    scan_flt = None if cache else flt
+
+    timer = _timer
+    records, pool = _map_files(functools.partial(_scrape_chunk, flt=scan_flt, timed=timer is not None,
+                                                 want_digest=cache is not None), todo, jobs)
+
+    try:
+        for f, hit in zip(files, hits):
+            if hit is not None:
+                if timer:
+                    timer.cached += 1
+                yield hit
+                continue
+            entries, stamp, *stats = next(records)
+            if stats:
+                timer.file(f, stats[0], stamp, len(entries))
+            if cache:
+                cache.store(f, entries, stamp)
+                if flt is not None:
+                    entries = [e for e in entries if flt(e)]
+            yield entries
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+def scrape_files(files, jobs=1, cache=None, flt=None):
+    """Scrape every file and return one entry list per file, in file order."""
+    return list(iter_scrape_files(files, jobs, cache, flt))
+
+def scrape_all(files, jobs=1, cache=None, flt=None):
+    """Scrape every file and return the concatenated entries in file order."""
+    return [e for file_entries in scrape_files(files, jobs, cache, flt) for e in file_entries]
+
+# ----------- Formatting -----------
+def md_sort_key(e):
+    return (e.date, e.ver_key)
+
+def format_markdown(entries):
+    """
+    Render CHANGELOG markdown, newest (date, version) group first.
+    One stable sort on the pre-parsed version key, then consecutive
+    grouping, so 1.0.10 sorts above 1.0.9 and entries keep scan order
+    within a group.
+    """
+    if not entries:
+        return "[info] no matching tags found."
+    entries = sorted(entries, key=md_sort_key, reverse=True)
+
+    chunks = []
+    for _, group in groupby(entries, key=md_sort_key):
+        items = list(group)
+        chunks.append(_md_header(items[0].date, items[0].ver, items))
+        chunks.extend(_md_bullet(it) for it in items)
+        chunks.append("\n---\n")
+    return "\n".join(chunks).strip()
+
+def _md_header(date, ver, items):
+    title = items[0].section
+    if any(it.section != title for it in items):
+        return f"## {date} — v{ver} — Section updates"
+    return f"## {date} — v{ver} — Section updates: {title}"
+
+def _md_bullet(it):
+    layer_tag = f"[{it.layer}:{it.tag}]" if it.layer else f"[{it.tag}]"
+    return f"- **{layer_tag}** ({it.section}) — {it.note}"
+
+def enrich_with_family(entries, registry):
+    """Attach 'family' to each entry in place (no copies); returns entries."""
+    for e in entries:
+        e.family = registry.get(e.tag) or "Unknown"
+    return entries
+
+def json_grouped(entries, by="tag"):
+    grouped = defaultdict(list)
+    for e in entries:
+        key = getattr(e, by, "")
+        grouped[key].append(e)
+    return grouped
+
+def apply_filters(entries, args, registry=None):
+    keep = ScanFilter.from_args(args, registry)
+    return [e for e in entries if keep(e)] if keep else entries
+
+def unknown_tags_warning(unknowns):
+    if not unknowns:
+        return ""
+    return f"[warn] unknown tags (consider adding to TAGS.md): {', '.join(sorted(unknowns))}\n"
+
+def stream_ndjson(per_file_entries, args, out=None):
+    """
+    Write one compact JSON object per entry as files are scraped, with the
+    filters and family enrichment applied inline; returns the stderr warning.
+    """
+    out = out or sys.stdout
+    registry = get_registry(args)
+    keep = ScanFilter.from_args(args, registry)
+    unknowns = set()
+    families = Counter()
+    for entries in per_file_entries:
+        lines = []
+        for e in entries:
+            if keep and not keep(e):
+                continue
+            e.family = registry.get(e.tag)
+            if not e.family:
+                e.family = "Unknown"
+                unknowns.add(e.tag)
+            families[e.family] += 1
+            lines.append(json.dumps(e.to_dict(), separators=(",", ":")) + "\n")
+        if lines:
+            out.write("".join(lines))
+            out.flush()
+    if _timer:
+        _timer.tagged(families, unknowns)
+    return unknown_tags_warning(unknowns)
+
+def prepare(entries, args):
+    """
+    Filter and enrich entries as the CLI args ask.
+    Returns (enriched, warning) where warning is "" or a stderr line.
+    """
+    # registry + family enrichment
+    registry = get_registry(args)
+    with phase("filter"):
+        entries = apply_filters(entries, args, registry)
+    with phase("enrich"):
+        enriched = enrich_with_family(entries, registry)
+
+    # warnings for unknown tags
+    unknowns = {e.tag for e in enriched if e.family == "Unknown"}
+    if _timer:
+        _timer.tagged(Counter(e.family for e in enriched), unknowns)
+    return enriched, unknown_tags_warning(unknowns)
+
+def render(entries, args):
+    """Filter, enrich and format entries; returns (text, warning)."""
+    enriched, warning = prepare(entries, args)
+    with phase("format"):
+        return _format(enriched, args), warning
+
+def _format(enriched, args):
+    # JSON modes
+    if args.json == "raw":
+        return json.dumps([e.to_dict() for e in enriched], indent=2)
+    if args.json == "ndjson":
+        return "\n".join(json.dumps(e.to_dict(), separators=(",", ":")) for e in enriched)
+    if args.json == "grouped":
+        grouped = json_grouped(enriched, by=args.group_by)
+        return json.dumps({k: [e.to_dict() for e in v] for k, v in grouped.items()}, indent=2)
+
+    # Markdown (CHANGELOG)
+    return format_markdown(enriched)
+
+# ----------- Tag check (--check) -----------
+def locate_entries(path, entries, text=None):
+    """
+    (line, column) of each entry's \Tag in path (or in text, its content),
+    1-based; (0, 0) if not found.
+    """
+    spots = defaultdict(list)
+    loose = defaultdict(list)   # bare \Tag[..]{NAME} references (e.g. CHANGELOG '**Tags**:' bullets)
+    try:
+        if text is None:
+            text = pathlib.Path(path).read_text(encoding="utf-8")
+        lines = text.splitlines()
+    except (OSError, ValueError):
+        lines = []
+    for no, line in enumerate(lines, 1):
+        mt = TAG_RE.search(line)
+        if mt:
+            key = (mt.group("tag").upper(), mt.group("date"), mt.group("ver"), mt.group("narr").strip())
+            spots[key].append((no, mt.start() + 1))
+        elif "\\Tag" in line:
+            for ref in MD_TAG_REF_RE.finditer(line):
+                loose[ref.group("tag").upper()].append((no, ref.start() + 1))
+    for found in chain(spots.values(), loose.values()):
+        found.reverse()
+    return [(spots.get((e.tag, e.date, e.ver, e.note)) or loose.get(e.tag) or [(0, 0)]).pop()
+            for e in entries]
+
+def _worktree_records(files, known, jobs=1, cache=None):
+    """
+    (path, entries, None) for each file that may hold an unknown tag.
+    Cached files are checked from their stored tag summary without reading
+    their entries.
+    """
+    summaries = [cache.tags(f) if cache else None for f in files]
+    misses = iter_scrape_files([f for f, tags in zip(files, summaries) if tags is None], jobs, cache)
+    try:
+        for f, tags in zip(files, summaries):
+            if tags is None:
+                yield f, next(misses), None
+            elif not tags <= known:
+                yield f, cache.lookup(f), None
+    finally:
+        misses.close()
+
+def _staged_records(blobs):
+    """(path, entries, text) for each staged blob."""
+    for path, data in read_staged(blobs):
+        try:
+            yield path, scan_source(data, path), data.decode("utf-8")
+        except ValueError as e:
+            sys.stderr.write(f"[warn] could not decode staged {path}: {e}\n")
+
+def check_tags(files, registry, jobs=1, cache=None, collect_all=False, out=None, staged=False):
+    """
+    Report unknown tags as 'file:line:col: error: ...' diagnostics and
+    return the count (stopping after the first unless collect_all).
+    With staged, files are staged_blobs() pairs read from the index.
+    Only files with an unknown tag are located line by line.
+    """
+    out = out or sys.stdout
+    known = {t for t, fam in registry.items() if fam}
+    records = _staged_records(files) if staged else _worktree_records(list(files), known, jobs, cache)
+    found = 0
+    try:
+        for f, entries, text in records:
+            bad = [e for e in entries if e.tag not in known]
+            for e, (line, col) in zip(bad, locate_entries(f, bad, text)):
+                layer_tag = f"{e.layer}:{e.tag}" if e.layer else e.tag
+                out.write(f"{f}:{line}:{col}: error: unknown tag '{e.tag}' "
+                          f"([{layer_tag}] {e.date} v{e.ver}; add it to TAGS.md)\n")
+                found += 1
+                if not collect_all:
+                    return found
+    finally:
+        records.close()
+        out.flush()
+    return found
+
+# ----------- Incremental CHANGELOG -----------
+ENTRY_ID_FIELDS = ("file", "tag", "layer", "date", "ver", "note")
+
+def entry_id(e):
+    """Stable 16-hex-digit ID of an entry's identity fields."""
+    key = "\x1f".join(getattr(e, k) for k in ENTRY_ID_FIELDS)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def _group_header_re(date, ver):
+    return re.compile(rf"^## {re.escape(date)} — v{re.escape(ver)} — Section updates(?P<title>: .*)?$")
+
+def append_incremental(outfile, entries, dry_run=False):
+    """
+    Append only entries not yet written to outfile, tracked by ID in the
+    sidecar '<outfile>.ids' (one ID per line, append-only).
+
+    New entries join their existing '## date — vX.Y.Z — Section updates'
+    group when the file has one; other groups are appended at the end.
+    Joining the file's last group only rewrites the separator after it;
+    the whole file is rewritten only when an earlier group grows or is
+    retitled. Without a sidecar, bullets already present under their
+    group count as written, so old full appends are not duplicated.
+    """
+    path = pathlib.Path(outfile)
+    ids_path = path.with_name(path.name + ".ids")
+    seen = set(ids_path.read_text(encoding="utf-8").split()) if ids_path.exists() else set()
+    raw = ""
+    if path.exists():
+        with open(path, encoding="utf-8", newline="") as fh:   # as stored, so offsets are exact
+            raw = fh.read()
+    lines = raw.splitlines()
+
+    new, new_ids = [], []
+    for e in entries:
+        eid = entry_id(e)
+        if eid not in seen:
+            seen.add(eid)
+            new.append(e)
+            new_ids.append(eid)
+    groups = defaultdict(list)
+    for e in new:
+        groups[(e.date, e.ver)].append(e)
+
+    rewrite = False
+    joined = []                 # (header, bullets) per existing group that grows
+    last, after_last = [], 0    # bullets for the file's last group, and the lines that follow it
+    for (date, ver), items in sorted(groups.items(), key=lambda kv: (kv[0][0], ver_key(kv[0][1])),
+                                     reverse=True):
+        hdr_re = _group_header_re(date, ver)
+        at = next((i for i, ln in enumerate(lines) if hdr_re.match(ln)), None)
+        if at is None:
+            continue
+        end = at + 1
+        while end < len(lines) and lines[end].startswith("- "):
+            end += 1
+        present = set(lines[at + 1:end])
+        bullets = [b for b in map(_md_bullet, items) if b not in present]
+        title = hdr_re.match(lines[at]).group("title")
+        if title and any(f": {it.section}" != title for it in items):
+            lines[at] = f"## {date} — v{ver} — Section updates"   # group now spans sections
+            rewrite = True
+        if bullets:
+            joined.append((lines[at], bullets))
+            if all(ln.strip() in ("", "---") for ln in lines[end:]):
+                last, after_last = bullets, len(lines) - end
+            else:
+                lines[end:end] = bullets
+                rewrite = True
+        del groups[(date, ver)]
+
+    tail = [e for items in groups.values() for e in items]
+    written = sum(len(b) for _, b in joined) + len(tail)
+    md = format_markdown(tail) if tail else ""
+    if dry_run:
+        print(f"--- would add {written} new entries to {outfile} ---")
+        for header, bullets in joined:
+            print("\n".join([header] + bullets) + "\n")
+        if md:
+            print(md)
+        return
+
+    if rewrite:
+        at = len(lines) - after_last
+        lines[at:at] = last
+        text = "\n".join(lines) + "\n"
+        if md:
+            text += "\n" + md + "\n"
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    elif last or md:
+        # write from the end of the last group's bullets only (its '---' and blank lines follow)
+        keep = raw.splitlines(keepends=True)
+        head = "".join(keep[:len(keep) - after_last])
+        text = "\n" if head and not head.endswith("\n") else ""
+        text += "".join(b + "\n" for b in last) + raw[len(head):]
+        if md:
+            text += "\n" + md + "\n"
+        with open(path, "r+b" if raw else "wb") as fh:
+            fh.seek(len(head.encode("utf-8")))
+            fh.write(text.encode("utf-8"))
+    if new_ids:
+        with open(ids_path, "a", encoding="utf-8") as fh:
+            fh.write("".join(eid + "\n" for eid in new_ids))
+    if written:
+        print(f"[ok] added {written} new entries to {outfile}")
+    else:
+        print(f"[ok] no new entries for {outfile}")
+
+# ----------- Engram database (--db) -----------
+class EngramDB:
+    """
+    Queryable engram in SQLite. Entries are upserted by entry_id(), with
+    the version split into integer columns so ranges compare numerically,
+    and indexed on tag, layer, family, date, version and file. Each store()
+    is a numbered run; rows of a fully rescanned file that the run did not
+    see again are deleted. Notes are indexed for search() in postings
+    (token -> entry ID with positions), maintained only for new and
+    deleted entries.
+    """
+    SCHEMA = 3
+    COLUMNS = ("id", "file", "section", "layer", "tag", "family", "date", "ver",
+               "ver_major", "ver_minor", "ver_patch", "note", "note_len", "run", "block")
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self.db.execute("SELECT value FROM meta WHERE key='schema'").fetchone()
+        if row and row[0] != str(self.SCHEMA):
+            self.db.execute("DROP TABLE IF EXISTS entries")
+            self.db.execute("DROP TABLE IF EXISTS postings")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            id TEXT PRIMARY KEY, file TEXT, section TEXT, layer TEXT, tag TEXT, family TEXT,
+            date TEXT, ver TEXT, ver_major INTEGER, ver_minor INTEGER, ver_patch INTEGER,
+            note TEXT, note_len INTEGER, run INTEGER, block INTEGER)""")
+        for name, cols in (("tag", "tag"), ("layer", "layer"), ("family", "family COLLATE NOCASE"),
+                           ("date", "date"), ("ver", "ver_major, ver_minor, ver_patch"), ("file", "file")):
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS entries_{name} ON entries ({cols})")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS postings (
+            token TEXT, id TEXT, positions TEXT, PRIMARY KEY (token, id)) WITHOUT ROWID""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS postings_id ON postings (id)")
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(self.SCHEMA),))
+
+    def store(self, entries, registry, files=None, scope=None, formats=None):
+        """
+        Upsert entries (family from registry) as a new run; with files, the
+        complete list of files this run scanned, drop their vanished rows.
+        With scope (the directory the scan covered), also drop the rows of
+        files under it that the scan no longer found: deleted, or in one of
+        formats but not selected any more. Returns (upserted, deleted).
+        """
+        row = self.db.execute("SELECT value FROM meta WHERE key='run'").fetchone()
+        run = int(row[0]) + 1 if row else 1
+        known = {}   # file -> IDs already stored (their postings are current)
+        rows, postings = [], []
+        for e in entries:
+            if e.file not in known:
+                known[e.file] = {r[0] for r in self.db.execute("SELECT id FROM entries WHERE file=?", (e.file,))}
+            eid = entry_id(e)
+            note_len = 0
+            if eid not in known[e.file]:
+                tokens = note_tokens(e.note)
+                note_len = len(tokens)
+                where = defaultdict(list)
+                for i, tok in enumerate(tokens):
+                    where[tok].append(i)
+                postings.extend((tok, eid, ",".join(map(str, pos))) for tok, pos in where.items())
+                known[e.file].add(eid)
+            major, minor, patch = ver_key(e.ver)
+            rows.append((eid, e.file, e.section, e.layer, e.tag, registry.get(e.tag) or "Unknown",
+                         e.date, e.ver, major, minor, patch, e.note, note_len, run, e.block))
+        with self.db:
+            self.db.executemany(
+                f"INSERT INTO entries VALUES ({', '.join('?' * len(self.COLUMNS))}) "
+                "ON CONFLICT(id) DO UPDATE SET section=excluded.section, family=excluded.family, "
+                "run=excluded.run, block=excluded.block", rows)
+            self.db.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?)", postings)
+            deleted = 0
+            for f in files or ():
+                self.db.execute("DELETE FROM postings WHERE id IN "
+                                "(SELECT id FROM entries WHERE file=? AND run<?)", (str(f), run))
+                deleted += self.db.execute("DELETE FROM entries WHERE file=? AND run<?",
+                                           (str(f), run)).rowcount
+            if files is not None and scope is not None:
+                for f in self._gone(files, scope, formats):
+                    self.db.execute("DELETE FROM postings WHERE id IN "
+                                    "(SELECT id FROM entries WHERE file=?)", (f,))
+                    deleted += self.db.execute("DELETE FROM entries WHERE file=?", (f,)).rowcount
+            if deleted:   # also sweeps postings orphaned by older versions
+                self.db.execute("DELETE FROM postings WHERE id NOT IN (SELECT id FROM entries)")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('run', ?)", (str(run),))
+        return len(rows), deleted
+
+    def _gone(self, files, scope, formats=None):
+        """Stored files under scope that a scan finding files should have found, but did not."""
+        scanned = {str(f) for f in files}
+        root = os.path.abspath(scope)
+        for (f,) in self.db.execute("SELECT DISTINCT file FROM entries").fetchall():
+            if f in scanned:
+                continue
+            path = os.path.abspath(f)
+            if path != root and not path.startswith(root.rstrip(os.sep) + os.sep):
+                continue
+            if not os.path.exists(path) or scanner_for(path, formats) is not None:
+                yield f
+
+    @staticmethod
+    def _where(flt=None, file=None):
+        """SQL conditions and parameters for a ScanFilter (and file)."""
+        where, params = [], []
+        if flt is not None:
+            for column, value in (("layer", flt.layer), ("tag", flt.tag)):
+                if value is not None:
+                    where.append(f"{column} = ?")
+                    params.append(value)
+            if flt.family is not None:
+                where.append("family = ? COLLATE NOCASE")
+                params.append(flt.family)
+            if flt.since:
+                where.append("date >= ?")
+                params.append(flt.since)
+            if flt.until:
+                where.append("date <= ?")
+                params.append(flt.until)
+            if flt.ver_lo:
+                where.append("(ver_major, ver_minor, ver_patch) >= (?, ?, ?)")
+                params.extend(flt.ver_lo)
+            if flt.ver_hi:
+                where.append("(ver_major, ver_minor, ver_patch) <= (?, ?, ?)")
+                params.extend(flt.ver_hi)
+            if flt.section is not None:
+                where.append("instr(lower(section), ?) > 0")
+                params.append(flt.section)
+        if file:
+            where.append("file = ?")
+            params.append(file)
+        return where, params
+
+    def query(self, flt=None, file=None, limit=None, doc_order=False):
+        """
+        Entries matching a ScanFilter (and file), in file/date/version order,
+        or with doc_order in each file's ledger-block (document) order.
+        """
+        where, params = self._where(flt, file)
+        sql = ("SELECT file, section, layer, tag, date, ver, note, family, block FROM entries"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + (" ORDER BY file, block, rowid" if doc_order
+                  else " ORDER BY file, date, ver_major, ver_minor, ver_patch, rowid"))
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [Entry(*r[:7], family=r[7], block=r[8]) for r in self.db.execute(sql, params)]
+
+    def search(self, text, flt=None, limit=20, require_all=False, k1=1.2, b=0.75):
+        """
+        BM25-ranked (score, Entry) pairs whose notes match the words of text;
+        "quoted phrases" must occur as consecutive tokens, and require_all
+        keeps only entries containing every word.
+        """
+        phrases = [note_tokens(m.group(1) or m.group(2)) for m in SEARCH_PART_RE.finditer(text)]
+        terms = list(dict.fromkeys(t for p in phrases for t in p))
+        phrases = [p for p in phrases if len(p) > 1]
+        if not terms:
+            return []
+        # N, avgdl and df over live entries only (older versions could leave orphaned postings)
+        n_docs, avg_len = self.db.execute("SELECT count(*), avg(note_len) FROM entries").fetchone()
+        hits = defaultdict(dict)   # id -> token -> positions
+        idf = {}
+        for tok in terms:
+            posting = self.db.execute("SELECT p.id, p.positions FROM postings p JOIN entries e ON e.id = p.id "
+                                      "WHERE p.token=?", (tok,)).fetchall()
+            idf[tok] = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for eid, pos in posting:
+                hits[eid][tok] = [int(x) for x in pos.split(",")]
+        if require_all:
+            hits = {eid: h for eid, h in hits.items() if len(h) == len(terms)}
+        hits = {eid: h for eid, h in hits.items() if all(_has_phrase(h, p) for p in phrases)}
+        if not hits:
+            return []
+
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS search_ids (id TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM search_ids")
+        self.db.executemany("INSERT INTO search_ids VALUES (?)", ((eid,) for eid in hits))
+        where, params = self._where(flt)
+        sql = ("SELECT id, note_len, file, section, layer, tag, date, ver, note, family FROM entries"
+               " WHERE id IN (SELECT id FROM search_ids)" + "".join(" AND " + w for w in where))
+        ranked = []
+        for eid, note_len, *fields in self.db.execute(sql, params):
+            norm = k1 * (1 - b + b * note_len / (avg_len or 1))
+            score = sum(idf[tok] * len(pos) * (k1 + 1) / (len(pos) + norm) for tok, pos in hits[eid].items())
+            ranked.append((score, Entry(*fields[:7], family=fields[7])))
+        ranked.sort(key=lambda r: (-r[0], r[1].date, r[1].file))
+        return ranked[:limit] if limit else ranked
+
+    def close(self):
+        self.db.close()
+
+def engram_scope(args):
+    """The directory an unfiltered --root/--from-main scan covers (None for listed or staged files)."""
+    if args.staged or args.files_from:
+        return None
+    if args.from_main:
+        return os.path.dirname(os.path.abspath(args.from_main))
+    return args.root
+
+def save_engram(path, entries, args, files=None):
+    """--db: upsert this run's entries into the EngramDB at path."""
+    with phase("db"):
+        try:
+            db = EngramDB(path)
+            try:
+                scope = engram_scope(args) if files is not None else None
+                upserted, deleted = db.store(entries, get_registry(args), files, scope, args.formats)
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            sys.stderr.write(f"[err] could not update {path}: {e}\n")
+            return
+    sys.stderr.write(f"[info] {path}: {upserted} entries upserted, {deleted} stale removed\n")
+
+def cmd_query(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py query",
+                                 description="Filtered reads from an engram database written with --db")
+    ap.add_argument("--db", default="engram.sqlite", help="Engram database (default: engram.sqlite)")
+    add_filter_args(ap)
+    ap.add_argument("--file", default=None, help="Only entries from this file (as stored)")
+    ap.add_argument("--count-by", choices=["tag", "layer", "family", "section", "date", "ver", "file"],
+                    default=None, help="Print entry counts per value instead of the entries")
+    ap.add_argument("--limit", type=int, default=None, help="At most N entries")
+    ap.add_argument("--json", choices=["", "raw", "grouped", "ndjson"], default="",
+                    help="Emit JSON instead of markdown")
+    ap.add_argument("--group-by", choices=["tag", "layer", "section"], default="tag",
+                    help="Grouping key for --json grouped")
+    args = ap.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        sys.stderr.write(f"[err] no engram database at {args.db} (write one with --db)\n")
+        return 2
+    flt = ScanFilter(layer=args.layer, tag=args.tag, family=args.family, section=args.section,
+                     since=args.since, until=args.until, ver_range=args.ver_range)
+    db = EngramDB(args.db)
+    try:
+        entries = db.query(flt, args.file, args.limit)
+    except (sqlite3.Error, ValueError) as e:
+        sys.stderr.write(f"[err] query: {e}\n")
+        return 2
+    finally:
+        db.close()
+    if args.count_by:
+        counts = Counter(getattr(e, args.count_by) for e in entries)
+        if args.json:
+            print(json.dumps(dict(counts.most_common()), indent=2))
+        else:
+            for value, n in counts.most_common():
+                print(f"{n:>7}  {value}")
+        return 0
+    print(_format(entries, args))
+    return 0
+
+# ----------- Note search (search) -----------
+NOTE_TOKEN_RE = re.compile(r"(\w+)|(\S)")
+SEARCH_PART_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+@functools.lru_cache(maxsize=8192)
+def _fold(word):
+    """Case- and accent-folded word: 'Résumé' -> 'resume', 'Δ' -> 'δ'."""
+    return "".join(c for c in unicodedata.normalize("NFKD", word.casefold()) if not unicodedata.combining(c))
+
+def note_tokens(text):
+    """
+    Search tokens of a note, in order: folded word runs in any script, and
+    symbol glyphs (∿, ✦, →) as one token each; dashes and other punctuation
+    only separate.
+    """
+    tokens = []
+    for word, other in NOTE_TOKEN_RE.findall(unicodedata.normalize("NFKC", text)):
+        if word:
+            tokens.append(_fold(word))
+        elif unicodedata.category(other)[0] == "S":
+            tokens.append(other)
+    return tokens
+
+def _has_phrase(hits, phrase):
+    """True when phrase's tokens sit at consecutive positions in hits (token -> positions)."""
+    first = hits.get(phrase[0])
+    if not first:
+        return False
+    rest = [set(hits.get(tok, ())) for tok in phrase[1:]]
+    return any(all(p + i in pos for i, pos in enumerate(rest, 1)) for p in first)
+
+def cmd_search(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py search",
+                                 description="Ranked full-text search over ledger notes in a --db engram")
+    ap.add_argument("query", help='Words to find; "quoted phrases" must match in order')
+    ap.add_argument("--db", default="engram.sqlite", help="Engram database (default: engram.sqlite)")
+    add_filter_args(ap)
+    ap.add_argument("--all", action="store_true", help="Only entries containing every word")
+    ap.add_argument("--limit", type=int, default=20, help="At most N results (0 = all; default 20)")
+    ap.add_argument("--json", choices=["", "raw", "ndjson"], default="", help="Emit JSON with a 'score' field")
+    args = ap.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        sys.stderr.write(f"[err] no engram database at {args.db} (write one with --db)\n")
+        return 2
+    flt = ScanFilter(layer=args.layer, tag=args.tag, family=args.family, section=args.section,
+                     since=args.since, until=args.until, ver_range=args.ver_range)
+    db = EngramDB(args.db)
+    try:
+        ranked = db.search(args.query, flt, args.limit, args.all)
+    except (sqlite3.Error, ValueError) as e:
+        sys.stderr.write(f"[err] search: {e}\n")
+        return 2
+    finally:
+        db.close()
+    if args.json:
+        rows = [dict(e.to_dict(), score=round(score, 4)) for score, e in ranked]
+        if args.json == "raw":
+            print(json.dumps(rows, indent=2, ensure_ascii=False))
+        else:
+            for r in rows:
+                print(json.dumps(r, ensure_ascii=False, separators=(",", ":")))
+    else:
+        for score, e in ranked:
+            print(f"{score:6.2f}  [{e.layer}:{e.tag}] {e.date} v{e.ver} — {e.note}")
+            print(f"        {e.section} · {e.file}")
+    return 0 if ranked else 1
+
+# ----------- Telemetry snapshots -----------
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_NAME_RE = re.compile(r"^engram_(?P<ts>\d{8}T\d{6}Z)(?:\.(?P<kind>full|delta))?\.json$")
+
+def snapshot_key(d):
+    """Identity of an engram entry (all fields, family included) within a snapshot."""
+    key = "\x1f".join(d.get(k) or "" for k in Entry.FIELDS + ("family",))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+class SnapshotStore:
+    """
+    Engram snapshots under one directory (telemetry/private):
+
+      engram_<ts>.full.json   {"kind": "full", "ts", "entries": [...]}
+      engram_<ts>.delta.json  {"kind": "delta", "ts", "base": <prev ts>,
+                               "ops": [[i, j, [added...]], ...]}
+
+    Each delta op replaces base[i:j] with the added entries (a diff of the
+    entry sequences), so a snapshot at any ts is rebuilt exactly, order
+    included, from the newest full checkpoint at or before it plus the
+    deltas after that. Legacy full dumps written by the
+    old telemetry-snapshot target (engram_<ts>.json, a plain list) count
+    as full checkpoints.
+    """
+
+    def __init__(self, directory, checkpoint_every=20):
+        self.dir = pathlib.Path(directory)
+        self.checkpoint_every = checkpoint_every
+
+    def snapshots(self):
+        """[(ts, kind, path)] oldest first."""
+        found = []
+        for p in self.dir.glob("engram_*.json") if self.dir.is_dir() else ():
+            m = SNAPSHOT_NAME_RE.match(p.name)
+            if m:
+                found.append((m.group("ts"), m.group("kind") or "full", p))
+        return sorted(found)
+
+    @staticmethod
+    def _load(path):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return {"kind": "full", "entries": data} if isinstance(data, list) else data
+
+    def state_at(self, ts=None):
+        """
+        (entries, chain) for the newest snapshot at or before ts (default:
+        latest; a prefix such as 20250809 covers that whole day); chain is the list of snapshots replayed, checkpoint first.
+        ([], []) when there is none.
+        """
+        snaps = [s for s in self.snapshots() if ts is None or s[0][:len(ts)] <= ts]
+        start = max((i for i, s in enumerate(snaps) if s[1] == "full"), default=None)
+        if start is None:
+            if snaps:
+                raise ValueError(f"no full checkpoint before {snaps[0][2].name}")
+            return [], []
+        chain = snaps[start:]
+        entries = []
+        for _, kind, path in chain:
+            data = self._load(path)
+            if kind == "full":
+                entries = data["entries"]
+                continue
+            for i, j, added in reversed(data["ops"]):
+                entries[i:j] = added
+        return entries, chain
+
+    def _write(self, ts, kind, payload):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self.dir / f"engram_{ts}.{kind}.json"
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(dict(format=SNAPSHOT_FORMAT, kind=kind, ts=ts, **payload),
+                                  ensure_ascii=False, separators=(",", ":")) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    def take(self, entries, ts):
+        """
+        Record entries (dicts) as the snapshot at ts: a delta against the
+        latest snapshot, or a full checkpoint when there is none yet or the
+        current chain has reached checkpoint_every deltas.
+        Returns the written path, or None when nothing changed.
+        """
+        prev, chain = self.state_at()
+        if chain and ts <= chain[-1][0]:
+            raise ValueError(f"snapshot {ts} is not newer than {chain[-1][0]}")
+        ops = []
+        if chain:
+            sm = difflib.SequenceMatcher(None, [snapshot_key(d) for d in prev],
+                                         [snapshot_key(d) for d in entries], autojunk=False)
+            ops = [[i1, i2, entries[j1:j2]] for tag, i1, i2, j1, j2 in sm.get_opcodes()
+                   if tag != "equal"]
+            if not ops:
+                return None
+        if not chain or len(chain) > self.checkpoint_every:
+            return self._write(ts, "full", {"entries": entries})
+        return self._write(ts, "delta", {"base": chain[-1][0], "ops": ops})
+
+    def compact(self, keep=0):
+        """
+        Fold everything but the newest `keep` snapshots into one full
+        checkpoint at the oldest kept one and delete the files it replaces.
+        Returns the number of files removed.
+        """
+        snaps = self.snapshots()
+        if not snaps:
+            return 0
+        cut = snaps[max(len(snaps) - max(keep, 1), 0)]
+        entries, _ = self.state_at(cut[0])
+        self._write(cut[0], "full", {"entries": entries})
+        removed = 0
+        for ts, kind, path in snaps:
+            if ts < cut[0] or (ts == cut[0] and kind != "full"):
+                path.unlink()
+                removed += 1
+            elif ts == cut[0] and path.name != f"engram_{ts}.full.json":
+                path.unlink()   # legacy dump replaced by the new checkpoint
+                removed += 1
+        return removed
+
+def cmd_snapshot(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py snapshot",
+                                 description="Delta-encoded engram telemetry snapshots")
+    ap.add_argument("--store", default="telemetry/private", help="Snapshot directory")
+    sub = ap.add_subparsers(dest="action", required=True)
+    t = sub.add_parser("take", help="Record the current engram (only the change since the last snapshot)")
+    t.add_argument("--root", default="sections", help="Root .tex folder or single .tex file")
+    t.add_argument("--tags-reg", default=None, help="Path to TAGS.md to classify tags")
+    t.add_argument("--jobs", "-j", type=int, default=1, help="Scrape files in N worker processes")
+    t.add_argument("--cache", default=None, metavar="DIR", help="Persistent parse cache directory")
+    t.add_argument("--checkpoint-every", type=int, default=20, metavar="N",
+                   help="Write a full checkpoint after N deltas (default: 20)")
+    t.add_argument("--ts", default=None, help="Snapshot timestamp (default: now, UTC, YYYYMMDDTHHMMSSZ)")
+    add_filter_args(t)
+    r = sub.add_parser("restore", help="Print the engram (--json raw shape) as of a snapshot")
+    r.add_argument("--at", default=None, metavar="TS", help="Timestamp or prefix (default: latest)")
+    c = sub.add_parser("compact", help="Fold old deltas into a single full checkpoint")
+    c.add_argument("--keep", type=int, default=0, metavar="N",
+                   help="Keep the newest N snapshots individually restorable")
+    sub.add_parser("list", help="List snapshots")
+    args = ap.parse_args(argv)
+
+    store = SnapshotStore(args.store)
+    try:
+        if args.action == "take":
+            ts = args.ts or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+            if not SNAPSHOT_NAME_RE.match(f"engram_{ts}.json"):
+                sys.stderr.write(f"[err] bad timestamp {ts!r} (want YYYYMMDDTHHMMSSZ)\n")
+                return 2
+            store.checkpoint_every = args.checkpoint_every
+            cache = ScrapeCache(args.cache) if args.cache else None
+            entries = scrape_all(find_files(args.root), jobs=args.jobs, cache=cache,
+                                 flt=ScanFilter.from_args(args))
+            if cache:
+                cache.close()
+            enriched, warning = prepare(entries, args)
+            sys.stderr.write(warning)
+            path = store.take([e.to_dict() for e in enriched], ts)
+            print(f"[ok] wrote {path}" if path else f"[ok] no change since last snapshot in {args.store}")
+        elif args.action == "restore":
+            entries, chain = store.state_at(args.at)
+            if not chain:
+                sys.stderr.write(f"[err] no snapshot at or before {args.at or 'now'} in {args.store}\n")
+                return 1
+            print(json.dumps(entries, indent=2))
+        elif args.action == "compact":
+            n = store.compact(args.keep)
+            print(f"[ok] compacted {args.store}: removed {n} files")
+        else:
+            for ts, kind, path in store.snapshots():
+                print(f"{ts}  {kind:<5}  {path.stat().st_size:>9}  {path.name}")
+    except (OSError, ValueError, KeyError) as e:
+        sys.stderr.write(f"[err] snapshot {args.action}: {e}\n")
+        return 1
+    return 0
+
+# ----------- Engram diff -----------
+DIFF_MATCH_FIELDS = ("file", "layer", "tag", "date", "ver")
+DIFF_CONTENT_FIELDS = ("section", "note", "family")   # family only when both sides have it
+JSON_CHUNK = 1 << 16
+
+def _iter_json_array(fh):
+    """Yield the elements of a JSON array one at a time, reading fh in chunks."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    while True:
+        while True:   # skip whitespace and separators
+            while pos < len(buf) and buf[pos] in " \t\r\n,[":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = fh.read(JSON_CHUNK), 0
+            eof = not buf
+        if pos >= len(buf) or buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            more = fh.read(JSON_CHUNK)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield obj
+        pos = end
+
+def iter_engram(path):
+    """
+    Stream entry dicts from an engram file: the indented --json raw list
+    (also emit.json), NDJSON, or the --json grouped mapping (loaded whole).
+    """
+    with open(path, encoding="utf-8") as fh:
+        head = fh.read(1)
+        while head and head.isspace():
+            head = fh.read(1)
+        if head == "[":
+            yield from _iter_json_array(fh)
+            return
+        first = head + fh.readline()
+        try:
+            obj = json.loads(first)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict) and "tag" in obj:   # NDJSON
+            yield obj
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        grouped = json.loads(first + fh.read())
+        if not isinstance(grouped, dict):
+            raise ValueError(f"{path}: not an engram list, NDJSON or grouped JSON")
+        yield from chain.from_iterable(grouped.values())
+
+def _norm_entry(d):
+    # emit.json spells 'ver' as 'version'
+    if "ver" not in d and "version" in d:
+        d = dict(d, ver=d["version"])
+        del d["version"]
+    return d
+
+def _diff_keys(entries):
+    """(match_id, content_digest, entry) with duplicates told apart by ordinal."""
+    seen = Counter()
+    for d in map(_norm_entry, entries):
+        match = "\x1f".join(d.get(k) or "" for k in DIFF_MATCH_FIELDS)
+        seen[match] += 1
+        mid = hashlib.sha1(f"{match}\x1f{seen[match]}".encode("utf-8")).digest()[:12]
+        content = f"{d.get('section') or ''}\x1f{d.get('note') or ''}"
+        yield mid, (hashlib.sha1(content.encode("utf-8")).digest()[:12], d.get("family")), d
+
+def diff_engrams(old, new):
+    """
+    Hash-join two entry streams on (file, layer, tag, date, ver, ordinal).
+    Only `old` is held in memory; yields ("added", None, d),
+    ("modified", old_d, new_d) while `new` streams, then ("removed", d, None).
+    """
+    table = {mid: (digest, d) for mid, digest, d in _diff_keys(old)}
+    for mid, digest, d in _diff_keys(new):
+        hit = table.pop(mid, None)
+        if hit is None:
+            yield "added", None, d
+        elif hit[0][0] != digest[0] or (hit[0][1] and digest[1] and hit[0][1] != digest[1]):
+            yield "modified", hit[1], d
+    for _, d in table.values():
+        yield "removed", d, None
+
+def _diff_source(spec, store, registry=None):
+    """An entry-dict iterator for a diff operand (file, scraped .tex tree, or @TS snapshot)."""
+    if spec.startswith("@"):
+        entries, chain = SnapshotStore(store).state_at(spec[1:])
+        if not chain:
+            raise ValueError(f"no snapshot at or before {spec[1:]} in {store}")
+        return iter(entries)
+    path = pathlib.Path(spec)
+    if path.is_dir() or path.suffix == ".tex":
+        entries = scrape_all(find_files(path))
+        if registry:
+            enrich_with_family(entries, registry)
+        return (e.to_dict() for e in entries)
+    return iter_engram(path)
+
+def cmd_diff(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py diff",
+                                 description="Added / removed / modified entries between two engrams")
+    ap.add_argument("old", help="Engram JSON/NDJSON file, .tex file or folder (scraped), or @TS snapshot")
+    ap.add_argument("new", help="Same forms as OLD")
+    ap.add_argument("--store", default="telemetry/private", help="Snapshot directory for @TS operands")
+    ap.add_argument("--tags-reg", default=None, help="Path to TAGS.md; adds 'family' to scraped operands")
+    ap.add_argument("--format", choices=["text", "ndjson", "json"], default="text",
+                    help="text: +/-/~ lines; ndjson: one change per line (streamed); "
+                         "json: {added, removed, modified} indented")
+    args = ap.parse_args(argv)
+
+    counts = Counter()
+    result = {"added": [], "removed": [], "modified": []}
+    try:
+        registry = get_registry(args) if args.tags_reg else None
+        changes = diff_engrams(_diff_source(args.old, args.store, registry),
+                               _diff_source(args.new, args.store, registry))
+        for op, old, new in changes:
+            counts[op] += 1
+            if args.format == "json":
+                result[op].append({"old": old, "new": new} if op == "modified" else old or new)
+            elif args.format == "ndjson":
+                rec = {"op": op, "entry": new or old}
+                if op == "modified":
+                    rec["old"] = old
+                print(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
+            else:
+                d = new or old
+                layer_tag = f"{d.get('layer')}:{d.get('tag')}" if d.get("layer") else d.get("tag")
+                sign = {"added": "+", "removed": "-", "modified": "~"}[op]
+                print(f"{sign} [{layer_tag}] {d.get('date')} v{d.get('ver')} ({d.get('file')}) — {d.get('note')}")
+                if op == "modified":
+                    for k in DIFF_CONTENT_FIELDS:
+                        if old.get(k) != new.get(k) and (k != "family" or (old.get(k) and new.get(k))):
+                            print(f"    {k}: {old.get(k)!r} -> {new.get(k)!r}")
+    except (OSError, ValueError, KeyError) as e:
+        sys.stderr.write(f"[err] diff: {e}\n")
+        return 2
+    if args.format == "json":
+        print(json.dumps(result, indent=2))
+    sys.stderr.write(f"[info] {counts['added']} added, {counts['removed']} removed, "
+                     f"{counts['modified']} modified\n")
+    return 1 if counts else 0
+
+# ----------- Tag analytics (analyze) -----------
+MATRICES = ("cooccurrence", "versions", "transitions")
+COOC_CHUNK = 4096   # groups per incidence block in the NumPy co-occurrence product
+
+@functools.lru_cache(maxsize=None)
+def _load_numpy():
+    """Import NumPy into the module on first use; analyze falls back to pure Python without it."""
+    global numpy
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    return numpy
+
+def _lookup(index, values):
+    """index[v] for each value, as an int64 array with NumPy (no intermediate list)."""
+    if numpy is not None:
+        return numpy.fromiter(map(index.__getitem__, values), dtype=numpy.int64, count=len(values))
+    return [index[v] for v in values]
+
+def _intern(values, key=None):
+    """Sorted distinct labels and the label index of each value."""
+    labels = sorted(set(values), key=key)
+    return labels, _lookup({v: i for i, v in enumerate(labels)}, values)
+
+def _codes(values):
+    """Label index of each value in first-seen order (when only grouping matters)."""
+    index = dict.fromkeys(values)
+    for i, v in enumerate(index):
+        index[v] = i
+    return _lookup(index, values)
+
+def _runs(*columns):
+    """Group number of each row: a new group wherever any column changes from the previous row."""
+    if numpy is not None and len(columns[0]):
+        cols = [numpy.asarray(c, dtype=numpy.int64) for c in columns]
+        change = numpy.zeros(len(cols[0]) - 1, dtype=bool)
+        for c in cols:
+            change |= c[1:] != c[:-1]
+        return numpy.concatenate(([0], numpy.cumsum(change)))
+    groups, n, prev = [], -1, None
+    for row in zip(*columns):
+        if row != prev:
+            n, prev = n + 1, row
+        groups.append(n)
+    return groups
+
+def _group_codes(entries, by, file_codes=None):
+    """
+    Co-occurrence group of each entry (file order): ledger block, section or
+    file. Blocks are the scanner's per-file ordinals; entries without one
+    (e.g. from git history) fall back to runs of the same file and section.
+    """
+    if by == "section":
+        return _codes([e.section for e in entries])
+    if file_codes is None:
+        file_codes = _codes([e.file for e in entries])
+    if by == "file":
+        return file_codes
+    blocks = [e.block for e in entries]
+    if None in blocks:
+        return _runs(file_codes, _codes([e.section for e in entries]))
+    return _runs(file_codes, blocks)
+
+def analyze_entries(entries, by="block", key="family", which=MATRICES):
+    """
+    Count matrices over enriched entries (file order); returns
+    {name: (row_labels, col_labels, counts)} with counts a 2-D NumPy array,
+    or a list of lists without NumPy:
+      cooccurrence  tag x tag, groups (see _group_codes) holding both tags
+      versions      version x tag entry histogram
+      transitions   key x key, consecutive entries of a file in version order
+    """
+    _load_numpy()
+    tags, tag_codes = _intern([e.tag for e in entries])
+    vers, ver_codes = _intern([e.ver for e in entries], key=ver_key)
+    file_codes = _codes([e.file for e in entries])
+    out = {}
+    T, V = len(tags), len(vers)
+    if "cooccurrence" in which:
+        out["cooccurrence"] = (tags, tags, _cooccurrence(_group_codes(entries, by, file_codes), tag_codes, T))
+    if "versions" in which:
+        if numpy is not None:
+            cells = numpy.asarray(ver_codes, dtype=numpy.int64) * T + numpy.asarray(tag_codes, dtype=numpy.int64)
+        else:
+            cells = [v * T + t for v, t in zip(ver_codes, tag_codes)]
+        out["versions"] = (vers, tags, _reshape(_bincount(cells, V * T), V, T))
+    if "transitions" in which:
+        states, state_codes = _intern([v or "Unknown" for v in map(attrgetter(key), entries)])
+        K = len(states)
+        if numpy is not None:
+            f, v, k = (numpy.asarray(c, dtype=numpy.int64) for c in (file_codes, ver_codes, state_codes))
+            order = numpy.lexsort((numpy.arange(len(f)), v, f))
+            f, k = f[order], k[order]
+            same = f[:-1] == f[1:]
+            counts = numpy.bincount(k[:-1][same] * K + k[1:][same], minlength=K * K).reshape(K, K)
+        else:
+            order = sorted(range(len(entries)), key=lambda i: (file_codes[i], ver_codes[i], i))
+            pairs = [state_codes[a] * K + state_codes[b] for a, b in zip(order, order[1:])
+                     if file_codes[a] == file_codes[b]]
+            counts = _reshape(_bincount(pairs, K * K), K, K)
+        out["transitions"] = (states, states, counts)
+    return out
+
+def _bincount(codes, size):
+    if numpy is not None:
+        return numpy.bincount(numpy.asarray(codes, dtype=numpy.int64), minlength=size)
+    flat = [0] * size
+    for c in codes:
+        flat[c] += 1
+    return flat
+
+def _reshape(flat, rows, cols):
+    if numpy is not None:
+        return flat.reshape(rows, cols)
+    return [flat[r * cols:(r + 1) * cols] for r in range(rows)]
+
+def _cooccurrence(group_codes, tag_codes, T):
+    """T x T counts of groups containing both tags (diagonal: groups containing the tag)."""
+    if numpy is None:
+        members = defaultdict(set)
+        for g, t in zip(group_codes, tag_codes):
+            members[g].add(t)
+        counts = [[0] * T for _ in range(T)]
+        for present in members.values():
+            for a in present:
+                row = counts[a]
+                for b in present:
+                    row[b] += 1
+        return counts
+    # entries sorted by group; 0/1 incidence blocks of COOC_CHUNK groups
+    # keep B.T @ B dense but small (repeats of a tag in a group set one cell)
+    g = numpy.asarray(group_codes, dtype=numpy.int64)
+    order = numpy.argsort(g, kind="stable")
+    g, t = g[order], numpy.asarray(tag_codes, dtype=numpy.int64)[order]
+    counts = numpy.zeros((T, T), dtype=numpy.int64)
+    bounds = numpy.searchsorted(g, numpy.arange(0, (g[-1] if len(g) else 0) + COOC_CHUNK + 1, COOC_CHUNK))
+    for lo, (a, b) in enumerate(zip(bounds, bounds[1:])):
+        if a == b:
+            continue
+        block = numpy.zeros((COOC_CHUNK, T), dtype=numpy.float64)
+        block[g[a:b] - lo * COOC_CHUNK, t[a:b]] = 1.0
+        counts += (block.T @ block).astype(numpy.int64)
+    return counts
+
+def _matrix_rows(counts):
+    return counts.tolist() if numpy is not None else counts
+
+def write_matrix(out, name, rows, cols, counts, fmt):
+    """One matrix as csv (labelled grid), json or a pgfplots 'matrix plot' table."""
+    counts = _matrix_rows(counts)
+    if fmt == "json":
+        json.dump({"name": name, "rows": rows, "cols": cols, "counts": counts}, out, ensure_ascii=False)
+        out.write("\n")
+    elif fmt == "csv":
+        w = csv.writer(out, lineterminator="\n")
+        w.writerow([name] + cols)
+        w.writerows([label] + row for label, row in zip(rows, counts))
+    else:
+        # \addplot3[matrix plot*] table[meta=count] {NAME.dat}; the tick labels are the comments
+        out.write(f"% {name}: {len(rows)} x {len(cols)}\n")
+        out.write(f"% yticklabels={{{','.join(map(str, rows))}}}\n")
+        out.write(f"% xticklabels={{{','.join(map(str, cols))}}}\n")
+        out.write("x y count\n")
+        for y, row in enumerate(counts):
+            out.write("".join(f"{x} {y} {c}\n" for x, c in enumerate(row)))
+            out.write("\n")
+
+def cmd_analyze(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py analyze",
+                                 description="Tag co-occurrence, per-version histograms and transition matrices")
+    add_input_args(ap)
+    add_filter_args(ap)
+    ap.add_argument("--db", default=None, metavar="ENGRAM.sqlite",
+                    help="Read entries from an engram database (--db) instead of scraping")
+    ap.add_argument("--tags-reg", default=None, help="Path to TAGS.md to classify tags")
+    ap.add_argument("--jobs", "-j", type=int, default=1, help="Scrape files in N worker processes")
+    ap.add_argument("--cache", default=None, metavar="DIR", help="Persistent parse cache directory")
+    ap.add_argument("--matrix", choices=MATRICES + ("all",), default="all", help="Which matrix to build")
+    ap.add_argument("--by", choices=["block", "section", "file"], default="block",
+                    help="Co-occurrence group: ledger block (default), section title or file")
+    ap.add_argument("--key", choices=["family", "layer", "tag"], default="family",
+                    help="Transition states (default: family; layer shows ONTO->EPI pairings)")
+    ap.add_argument("--format", choices=["csv", "json", "pgfplots"], default="csv")
+    ap.add_argument("--out", default=None, metavar="DIR",
+                    help="Write NAME.csv / NAME.json / NAME.dat per matrix here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    registry = get_registry(args)
+    flt = ScanFilter.from_args(args, registry)
+    try:
+        if args.db:
+            db = EngramDB(args.db)
+            try:
+                entries = db.query(flt, doc_order=True)
+            finally:
+                db.close()
+            if args.tags_reg:
+                enrich_with_family(entries, registry)
+        else:
+            cache = ScrapeCache(args.cache) if args.cache else None
+            try:
+                entries = list(chain.from_iterable(
+                    iter_scrape_files(input_files(args, cache), args.jobs, cache, flt)))
+            finally:
+                if cache:
+                    cache.close()
+            enrich_with_family(entries, registry)
+    except (OSError, sqlite3.Error) as e:
+        sys.stderr.write(f"[err] analyze: {e}\n")
+        return 2
+
+    which = MATRICES if args.matrix == "all" else (args.matrix,)
+    _load_numpy()   # not timed below
+    t0 = time.perf_counter()
+    matrices = analyze_entries(entries, args.by, args.key, which)
+    sys.stderr.write(f"[info] {len(entries)} entries analyzed in {(time.perf_counter() - t0)*1e3:.1f} ms "
+                     f"({'numpy' if numpy is not None else 'pure Python'})\n")
+
+    ext = {"csv": "csv", "json": "json", "pgfplots": "dat"}[args.format]
+    for n, name in enumerate(which):
+        rows, cols, counts = matrices[name]
+        if args.out:
+            path = pathlib.Path(args.out) / f"{name}.{ext}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8", newline="") as fh:
+                write_matrix(fh, name, rows, cols, counts, args.format)
+            sys.stderr.write(f"[ok] wrote {path}\n")
+        else:
+            if n and args.format != "json":
+                print()
+            write_matrix(sys.stdout, name, rows, cols, counts, args.format)
+    return 0
+
+# ----------- Daemon (--serve) -----------
+class LedgerIndex:
+    """In-memory per-file entry index for the --serve daemon."""
+
+    def __init__(self, root, jobs=1, cache=None, formats=("tex",)):
+        self.root = root
+        self.formats = tuple(formats)
+        self.lock = threading.Lock()
+        files = find_files(root, self.formats)
+        self.by_file = dict(zip(files, scrape_files(files, jobs, cache)))
+
+    def entries(self):
+        with self.lock:
+            return [e for f in sorted(self.by_file) for e in self.by_file[f]]
+
+    def refresh(self, path):
+        path = pathlib.Path(path)
+        with self.lock:
+            known = path in self.by_file
+        if not known and (path.name.startswith(".") or scanner_for(path, self.formats) is None):
+            return
+        entries = None
+        if path.is_file():
+            stats = {} if _timer else None
+            entries, stamp = _scrape_record(path, stats=stats)
+            if stats is not None:
+                _timer.file(path, stats, stamp, len(entries))
+        with self.lock:
+            if entries is None:
+                self.by_file.pop(path, None)
+            else:
+                self.by_file[path] = entries
+
+    def resync(self):
+        """Full directory re-walk: picks up new/removed files and subdirectories."""
+        current = set(find_files(self.root, self.formats))
+        with self.lock:
+            known = set(self.by_file)
+        for f in sorted(known - current):
+            self.refresh(f)
+        for f in sorted(current - known):
+            self.refresh(f)
+
+class _Inotify:
+    """Minimal ctypes inotify binding (Linux); raises OSError elsewhere."""
+    IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x2, 0x8, 0x40, 0x80
+    IN_CREATE, IN_DELETE, IN_ISDIR = 0x100, 0x200, 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        import ctypes, ctypes.util
+        name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(name, use_errno=True) if name else None
+        if libc is None or not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not available")
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+
+    def watch_tree(self, root):
+        root = pathlib.Path(root)
+        if skipped_dir(root.name) and self.dirs:   # a new hidden subdirectory; the root itself is watched
+            return
+        tree = [root]
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not skipped_dir(d)]
+            tree.extend(pathlib.Path(dirpath) / d for d in dirnames)
+        for d in sorted(tree):
+            if d in self.dirs.values():
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(str(d)), self.MASK)
+            if wd >= 0:
+                self.dirs[wd] = d
+
+    def events(self):
+        """Block for the next batch of events; yields (path, is_dir)."""
+        buf = os.read(self.fd, 64 * 1024)
+        off = 0
+        while off < len(buf):
+            wd, mask, _cookie, size = self.EVENT.unpack_from(buf, off)
+            off += self.EVENT.size
+            name = buf[off:off + size].rstrip(b"\0").decode("utf-8", "replace")
+            off += size
+            if wd in self.dirs and name:
+                yield self.dirs[wd] / name, bool(mask & self.IN_ISDIR)
+
+def _watch_inotify(index, notify):
+    notify.watch_tree(index.root)
+    while True:
+        for path, is_dir in notify.events():
+            if is_dir:
+                if path.is_dir():
+                    notify.watch_tree(path)
+                index.resync()
+            else:
+                index.refresh(path)
+
+def _watch_poll(index, interval=1.0):
+    def snapshot():
+        stamps = {}
+        for f in find_files(index.root, index.formats):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            stamps[f] = (st.st_size, st.st_mtime_ns)
+        return stamps
+
+    seen = snapshot()
+    while True:
+        time.sleep(interval)
+        now = snapshot()
+        for f in set(seen) | set(now):
+            if seen.get(f) != now.get(f):
+                index.refresh(f)
+        seen = now
+
+# query flags a daemon renders from its index; any other flag off its default is scanned locally
+DAEMON_RENDERS = {"layer", "tag", "family", "section", "since", "until", "ver_range", "tags_reg",
+                  "json", "group_by", "mode", "outfile", "socket", "jobs", "cache"}
+# input flags --serve cannot honour (it indexes --root in --formats)
+SERVE_REJECTS = ("files_from", "from_main", "tex_path", "staged")
+
+def daemon_refusal(q, defaults, root, formats, cwd):
+    """
+    Why a daemon indexing root (in formats, from its own cwd) cannot answer
+    the parsed query q sent from cwd exactly as a local run would, or None.
+    """
+    for dest, value in vars(q).items():
+        if dest not in DAEMON_RENDERS and dest not in ("root", "formats") and value != defaults[dest]:
+            return f"--{dest.replace('_', '-')} needs a local run"
+    if q.mode != "print" and q.outfile != "-" and not q.json:
+        return "--outfile is written locally"
+    # entries carry the root as spelled, so the spelling (and, when relative, the cwd) must match
+    if q.root != root or (not os.path.isabs(root) and os.path.realpath(cwd) != os.path.realpath(os.getcwd())):
+        return f"it indexes --root {root} (from {os.getcwd()})"
+    if tuple(q.formats) != formats:
+        return f"it indexes --formats {','.join(formats)}"
+    return None
+
+def serve(args):
+    """
+    Keep a hot LedgerIndex for args.root and answer queries on a Unix socket.
+    A query is one JSON line {"argv": [...], "cwd": dir} carrying the client's
+    CLI flags; the reply is {"out": text, "err": warning}, or {"refused":
+    reason} when the query selects other files or needs a local run (see
+    daemon_refusal). With --metrics-port, scrape metrics are also served over
+    HTTP on 127.0.0.1:PORT/metrics.
+    """
+    import socket, socketserver
+    global _timer
+    given = [f"--{dest.replace('_', '-')}" for dest in SERVE_REJECTS if getattr(args, dest)]
+    if given:
+        sys.stderr.write(f"[err] --serve indexes --root only; it cannot honour {', '.join(given)}\n")
+        return 2
+    sock_path = args.socket or ".scrape-tags.sock"
+    if os.path.exists(sock_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(sock_path)
+            sys.stderr.write(f"[err] a scraper daemon is already listening on {sock_path}\n")
+            return 1
+        except OSError:
+            os.unlink(sock_path)   # stale socket from a killed daemon
+
+    if args.metrics_port is not None and _timer is None:
+        _timer = PhaseTimer()
+    cache = ScrapeCache(args.cache) if args.cache else None
+    index = LedgerIndex(args.root, jobs=args.jobs, cache=cache, formats=args.formats)
+    if cache:
+        cache.close()
+
+    try:
+        watcher, how = functools.partial(_watch_inotify, index, _Inotify()), "inotify"
+    except OSError:
+        watcher, how = functools.partial(_watch_poll, index), "polling"
+    threading.Thread(target=watcher, daemon=True).start()
+
+    parser = build_parser()
+    defaults = vars(parser.parse_args([]))
+    render_lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if not line.strip():   # liveness probe
+                return
+            try:
+                req = json.loads(line.decode("utf-8"))
+                cwd = req.get("cwd", os.getcwd())
+                try:
+                    q = parser.parse_args(req.get("argv", []))
+                except SystemExit:   # --help or a usage error: argparse reports it locally
+                    reply = {"refused": "not a query"}
+                else:
+                    reason = daemon_refusal(q, defaults, index.root, index.formats, cwd)
+                    if reason:
+                        reply = {"refused": reason}
+                    else:
+                        if q.tags_reg:
+                            q.tags_reg = os.path.join(cwd, q.tags_reg)
+                        with render_lock:   # enrichment sets 'family' on the shared entries
+                            out, err = render(index.entries(), q)
+                        reply = {"out": out, "err": err}
+            except ValueError as e:
+                reply = {"out": "", "err": f"[err] bad query: {e}\n"}
+            self.wfile.write(json.dumps(reply).encode("utf-8"))
+
+    if args.metrics_port is not None:
+        serve_metrics(args.metrics_port, index, args)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with socketserver.ThreadingUnixStreamServer(sock_path, Handler) as server:
+        server.daemon_threads = True
+        sys.stderr.write(f"[info] serving {args.root} on {sock_path} ({how}); Ctrl-C to stop\n")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(sock_path)
+    return 0
+
+def serve_metrics(port, index, args):
+    """Serve _timer's metrics on http://127.0.0.1:port/metrics from a background thread."""
+    import http.server
+    registry = get_registry(args)
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            # per-family gauges of the live index; no prepare(), so no phase time is added
+            families = Counter(registry.get(e.tag) or "Unknown" for e in index.entries())
+            _timer.tagged(families, {e.tag for e in index.entries() if e.tag not in registry})
+            body = _timer.prometheus(counters=True).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sys.stderr.write(f"[info] metrics on http://127.0.0.1:{server.server_port}/metrics\n")
+    return server
+
+# ----------- Git history miner -----------
+class BlobReader:
+    """One long-lived `git cat-file --batch` pipe for reading blobs by SHA."""
+
+    def __init__(self, repo="."):
+        self.proc = subprocess.Popen(["git", "-C", repo, "cat-file", "--batch"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha):
+        self.proc.stdin.write(sha.encode("ascii") + b"\n")
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().split()
+        if len(header) < 3 or header[1] != b"blob":
+            return None
+        data = self.proc.stdout.read(int(header[2]))
+        self.proc.stdout.read(1)   # trailing LF
+        return data
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+NULL_SHA = "0" * 40
+COMMIT_MARK = "\x01"
+
+def _git_unquote(path):
+    """Undo git's C-style quoting of unusual paths in --raw output."""
+    if path.startswith('"') and path.endswith('"'):
+        return codecs.escape_decode(path[1:-1].encode("utf-8"))[0].decode("utf-8", "replace")
+    return path
+
+def iter_history_commits(repo=".", rev="HEAD", pathspec="*.tex"):
+    """
+    Yield (sha, date, subject, [(path, old_blob, new_blob), ...]) oldest first,
+    following first parents, from a single `git log --raw` process.
+    """
+    cmd = ["git", "-C", repo, "log", "--reverse", "--first-parent", "-m", "--raw",
+           "--no-abbrev", "--no-renames", f"--format={COMMIT_MARK}%H %cI %s", rev, "--", pathspec]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
+    head, changes = None, []
+    for line in proc.stdout:
+        line = line.rstrip("\n")
+        if line.startswith(COMMIT_MARK):
+            if head:
+                yield head + (changes,)
+            sha, date, subject = (line[1:].split(" ", 2) + [""])[:3]
+            head, changes = (sha, date, subject), []
+        elif line.startswith(":") and "\t" in line:
+            meta, path = line.split("\t", 1)
+            fields = meta.split()
+            changes.append((_git_unquote(path), fields[2], fields[3]))
+    if head:
+        yield head + (changes,)
+    if proc.wait() != 0:
+        raise RuntimeError(f"git log failed (exit {proc.returncode})")
+
+def mine_history(repo=".", rev="HEAD", pathspec="*.tex", flt=None):
+    """
+    Yield one delta per commit that changes ledger entries:
+    (sha, date, subject, added, removed), with Entry lists in file order.
+    Blobs are read through one cat-file pipe and parsed once per blob SHA.
+    """
+    reader = BlobReader(repo)
+    parsed = {NULL_SHA: []}   # blob SHA -> entry field tuples (without file)
+
+    def fields_of(sha, path):
+        if sha not in parsed:
+            data = reader.read(sha)
+            try:
+                entries = scan_bytes(data, path, flt) if data is not None else []
+            except ValueError as e:
+                sys.stderr.write(f"[warn] could not decode {path} @ {sha[:10]}: {e}\n")
+                entries = []
+            parsed[sha] = [e.fields()[1:] for e in entries]
+        return parsed[sha]
+
+    try:
+        for sha, date, subject, changes in iter_history_commits(repo, rev, pathspec):
+            added, removed = [], []
+            for path, old, new in changes:
+                old_f, new_f = fields_of(old, path), fields_of(new, path)
+                gone, came = Counter(old_f), Counter(new_f)
+                gone.subtract(new_f)
+                came.subtract(old_f)
+                for f in old_f:
+                    if gone[f] > 0:
+                        gone[f] -= 1
+                        removed.append(Entry(path, *f))
+                for f in new_f:
+                    if came[f] > 0:
+                        came[f] -= 1
+                        added.append(Entry(path, *f))
+            if added or removed:
+                yield sha, date, subject, added, removed
+    finally:
+        reader.close()
+
+def cmd_history(argv):
+    ap = argparse.ArgumentParser(prog="scrape_tags.py history",
+                                 description="Per-commit added/removed ledger entries across git history")
+    ap.add_argument("rev", nargs="?", default="HEAD", help="Revision or range (default: HEAD)")
+    ap.add_argument("--repo", default=".", help="Git repository (default: .)")
+    ap.add_argument("--root", default="", help="Only .tex files under this directory")
+    ap.add_argument("--format", choices=["text", "ndjson"], default="text",
+                    help="text: one block per commit; ndjson: one JSON object per commit")
+    ap.add_argument("--tags-reg", default=None, help="Path to TAGS.md (for --family)")
+    add_filter_args(ap)
+    args = ap.parse_args(argv)
+
+    root = args.root.strip("/")
+    pathspec = f"{root}/*.tex" if root and root != "." else "*.tex"
+    flt = ScanFilter.from_args(args)
+    try:
+        for sha, date, subject, added, removed in mine_history(args.repo, args.rev, pathspec, flt):
+            if args.format == "ndjson":
+                print(json.dumps({"commit": sha, "date": date, "subject": subject,
+                                  "added": [e.to_dict() for e in added],
+                                  "removed": [e.to_dict() for e in removed]}), flush=True)
+                continue
+            print(f"commit {sha} {date} {subject}")
+            for sign, items in (("+", added), ("-", removed)):
+                for e in items:
+                    layer_tag = f"{e.layer}:{e.tag}" if e.layer else e.tag
+                    print(f"  {sign} [{layer_tag}] {e.date} v{e.ver} ({e.file}) — {e.note}")
+            print()
+    except (OSError, RuntimeError) as e:
+        sys.stderr.write(f"[err] history: {e}\n")
+        return 1
+    return 0
+
+# ----------- Staged files (--staged) -----------
+def staged_blobs(root="sections", only=None):
+    """
+    [(path, blob_sha)] for .tex files under root that are added, copied,
+    modified or renamed in the index, paths relative to the current
+    directory; only (a set of paths) narrows the list further.
+    """
+    r = pathlib.Path(root)
+    pathspec = str(r) if r.suffix == ".tex" else ("*.tex" if str(r) == "." else f"{r}/*.tex")
+    # paths come back relative to the top level (--relative would drop those outside the cwd)
+    top = subprocess.run(["git", "rev-parse", "--show-toplevel"],
+                         capture_output=True, check=True).stdout.decode("utf-8").rstrip("\n")
+    out = subprocess.run(["git", "diff", "--cached", "--raw", "-z", "--no-abbrev",
+                          "--diff-filter=ACMR", "--", pathspec],
+                         capture_output=True, check=True).stdout.decode("utf-8", "replace")
+    fields = out.split("\0")
+    blobs = []
+    k = 0
+    while k < len(fields) - 1:
+        meta = fields[k].split()
+        k += 1
+        if meta[-1][0] in "RC":   # renames and copies list the source path first
+            k += 1
+        path = pathlib.Path(os.path.relpath(os.path.join(top, fields[k])))
+        k += 1
+        if only is None or path in only:
+            blobs.append((path, meta[3]))
+    return blobs
+
+def read_staged(blobs):
+    """Yield (path, bytes) for staged_blobs() pairs through one cat-file pipe."""
+    reader = BlobReader()
+    try:
+        for path, sha in blobs:
+            data = reader.read(sha)
+            if data is not None:
+                yield path, data
+    finally:
+        reader.close()
+
+def iter_staged_files(blobs, flt=None):
+    """Yield one entry list per staged blob, like iter_scrape_files()."""
+    for path, data in read_staged(blobs):
+        try:
+            yield scan_source(data, path, flt)
+        except ValueError as e:
+            sys.stderr.write(f"[warn] could not decode staged {path}: {e}\n")
+            yield []
+
+def iter_inputs(args, cache=None, flt=None, files=None):
+    """
+    Per-file entry lists for the files the CLI args select (--staged,
+    --files-from, --root), or for files when already listed.
+    """
+    if args.staged:
+        return iter_staged_files(staged_input(args), flt)
+    return iter_scrape_files(input_files(args, cache) if files is None else files, args.jobs, cache, flt)
+
+def staged_input(args):
+    """staged_blobs() for the CLI args; exits 2 with git's one-line reason when git fails."""
+    only = set(read_file_list(args.files_from, args.formats)) if args.files_from else None
+    try:
+        return staged_blobs(args.root, only)
+    except subprocess.CalledProcessError as e:
+        # outside a work tree `git diff` falls back to --no-index and rejects --cached
+        if subprocess.run(["git", "rev-parse", "--git-dir"], capture_output=True).returncode:
+            reason = "not a git repository"
+        else:
+            lines = e.stderr.decode("utf-8", "replace").strip().splitlines()
+            reason = lines[0].removeprefix("fatal: ") if lines else f"git exited with status {e.returncode}"
+    except OSError as e:
+        reason = f"could not run git: {e}"
+    sys.stderr.write(f"[err] --staged: {reason}\n")
+    sys.exit(2)
+
+# ----------- CLI -----------
+def add_filter_args(ap):
+    """The entry filters shared by the main CLI and subcommands (see ScanFilter)."""
+    ap.add_argument("--layer", default=None, help="Filter by layer: ONTO or EPI")
+    ap.add_argument("--tag", default=None, help="Filter by tag name")
+    ap.add_argument("--family", default=None, help="Filter by tag family (e.g. Process, Unknown)")
+    ap.add_argument("--section", default=None, help="Filter by section title (substring, any case)")
+    ap.add_argument("--since", type=date_arg, default=None, metavar="YYYY-MM-DD",
+                    help="Only entries on/after this date")
+    ap.add_argument("--until", type=date_arg, default=None, metavar="YYYY-MM-DD",
+                    help="Only entries on/before this date")
+    ap.add_argument("--ver-range", type=ver_range_arg, default=None, metavar="LO:HI",
+                    help="Only versions in LO..HI, inclusive (e.g. 1.0.4:1.0.9, 1.0.5:, :1.0.3, 1.0 = 1.0.*)")
+
+def add_input_args(ap):
+    """The file selection flags shared by the main CLI and subcommands (see input_files)."""
+    ap.add_argument("--root", default="sections", help="Root .tex folder or single .tex file")
+    ap.add_argument("--files-from", default=None, metavar="FILE",
+                    help="Scrape the .tex files listed in FILE ('-' = stdin) instead of walking --root")
+    ap.add_argument("--from-main", default=None, metavar="MAIN.tex",
+                    help="Scrape the files MAIN.tex pulls in via \\input/\\include, in document order")
+    ap.add_argument("--tex-path", action="append", default=None, metavar="DIR",
+                    help="Extra include search directory for --from-main (repeatable; default: $TEXINPUTS)")
+    ap.add_argument("--formats", type=parse_formats, default=("tex",), metavar="LIST",
+                    help=f"Source formats to scan under --root: comma list of {', '.join(FORMATS)}, or all "
+                         "(default: tex)")
+
+def build_parser():
+    ap = argparse.ArgumentParser()
+    add_input_args(ap)
+    ap.add_argument("--staged", action="store_true",
+                    help="Scrape the staged (index) contents of .tex files changed under --root")
+    ap.add_argument("--outfile", default="-", help="CHANGELOG path or '-' for stdout")
+    ap.add_argument("--mode", choices=["print","append","incremental"], default="print",
+                    help="Markdown output mode for CHANGELOG (incremental: only entries not yet written)")
+    add_filter_args(ap)
+    ap.add_argument("--tags-reg", default=None, help="Path to TAGS.md to validate/classify tags")
+    ap.add_argument("--json", choices=["", "raw", "grouped", "ndjson"], default="",
+                    help="Emit JSON to stdout instead of markdown (ndjson: streamed, one entry per line)")
+    ap.add_argument("--group-by", choices=["tag","layer","section"], default="tag",
+                    help="Grouping key for --json grouped")
+    ap.add_argument("--jobs", "-j", type=int, default=1,
+                    help="Scrape files in N worker processes (0 = one per CPU)")
+    ap.add_argument("--cache", default=None, metavar="DIR",
+                    help="Persistent parse cache directory (e.g. .scrape-cache)")
+    ap.add_argument("--serve", action="store_true",
+                    help="Run as a daemon: watch --root and answer queries on --socket")
+    ap.add_argument("--socket", default=None, metavar="PATH",
+                    help="Daemon Unix socket; clients use a live daemon here if one answers")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--check", action="store_true",
+                    help="Only validate tags: exit 1 on the first unknown tag (file:line diagnostics)")
+    ap.add_argument("--all", action="store_true", help="With --check, report every unknown tag")
+    ap.add_argument("--timings", type=int, nargs="?", const=10, default=None, metavar="N",
+                    help="Report per-phase wall/CPU time, scan totals and the N slowest files (default 10) on stderr")
+    ap.add_argument("--profile", default=None, metavar="FILE",
+                    help="Write cProfile stats for the run to FILE (read with python3 -m pstats FILE)")
+    ap.add_argument("--metrics-out", default=None, metavar="PATH.prom",
+                    help="Atomically write Prometheus textfile metrics (files, cache hits, tags per family, "
+                         "unknown tags, scan-time histogram) after the run")
+    ap.add_argument("--db", default=None, metavar="ENGRAM.sqlite",
+                    help="Also upsert the scraped entries into this SQLite engram (read it with the query subcommand)")
+    ap.add_argument("--metrics-port", type=int, default=None, metavar="PORT",
+                    help="With --serve, also serve the metrics on http://127.0.0.1:PORT/metrics")
+    return ap
+
+# subcommands take the rest of argv; anything else is the flag-style CLI
+SUBCOMMANDS = {
+    "registry": cmd_registry,
+    "history": cmd_history,
+    "snapshot": cmd_snapshot,
+    "diff": cmd_diff,
+    "ledger": cmd_ledger,
+    "query": cmd_query,
+    "search": cmd_search,
+    "analyze": cmd_analyze,
+}
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SUBCOMMANDS:
+        sys.exit(SUBCOMMANDS[argv[0]](argv[1:]))
+
+    args = build_parser().parse_args(argv)
+    if args.timings is None and not args.profile and not args.metrics_out:
+        return run(args)
+    return run_instrumented(args)
+
+def run_instrumented(args):
+    """
+    run() under --timings (phase report), --profile (cProfile stats file)
+    and/or --metrics-out (Prometheus textfile).
+    """
+    global _timer
+    _timer = PhaseTimer(keep=args.timings or 10)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    w0, c0 = time.perf_counter(), time.process_time()
+    try:
+        if profiler:
+            profiler.enable()
+        return run(args)
+    finally:
+        if profiler:
+            profiler.disable()
+        wall, cpu = time.perf_counter() - w0, time.process_time() - c0
+        if args.timings is not None:
+            _timer.report(wall, cpu, top=args.timings)
+        if args.metrics_out:
+            try:
+                write_metrics(args.metrics_out, _timer.prometheus(wall))
+            except OSError as e:
+                sys.stderr.write(f"[err] could not write metrics: {e}\n")
+        if profiler:
+            import pstats
+            profiler.dump_stats(args.profile)
+            sys.stderr.write(f"[ok] wrote profile to {args.profile} (python3 -m pstats {args.profile})\n")
+            if args.timings is not None:
+                pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+        _timer = None
+
+def run(args):
+    if args.serve:
+        sys.exit(serve(args))
+    if args.check:
+        cache = ScrapeCache(args.cache) if args.cache and not args.staged else None
+        try:
+            files = staged_input(args) if args.staged else input_files(args, cache)
+        except OSError as e:
+            sys.stderr.write(f"[err] could not list input files: {e}\n")
+            sys.exit(2)
+        found = check_tags(files, get_registry(args), args.jobs, cache, args.all, staged=args.staged)
+        if cache:
+            cache.close()
+        if found:
+            sys.stderr.write(f"[err] unknown tags found ({found}{'' if args.all else '+'})\n")
+        sys.exit(1 if found else 0)
+
+    appending = args.mode != "print" and args.outfile != "-" and not args.json
+    if args.json == "ndjson":
+        cache = ScrapeCache(args.cache) if args.cache else None
+        flt = ScanFilter.from_args(args)
+        files = None if args.staged else input_files(args, cache)
+        per_file = iter_inputs(args, cache, flt, files)
+        kept = []
+        if args.db:
+            per_file = (kept.extend(entries) or entries for entries in per_file)
+        with phase("stream"):
+            warning = stream_ndjson(per_file, args)
+        if cache:
+            cache.close()
+        sys.stderr.write(warning)
+        if args.db:
+            save_engram(args.db, kept, args, files if flt is None else None)
+        return
+    else:
+        cache = ScrapeCache(args.cache) if args.cache else None
+        flt = ScanFilter.from_args(args)
+        files = None if args.staged else input_files(args, cache)
+        per_file = iter_inputs(args, cache, flt, files)
+        with phase("scan"):
+            all_entries = list(chain.from_iterable(per_file))
+        if cache:
+            cache.close()
+        if args.db:
+            save_engram(args.db, all_entries, args, files if flt is None else None)
+        if appending and args.mode == "incremental":
+            enriched, warning = prepare(all_entries, args)
+            if warning:
+                sys.stderr.write(warning)
+            append_incremental(args.outfile, enriched, dry_run=args.dry_run)
+            return
+        text, warning = render(all_entries, args)
+
+    if warning:
+        sys.stderr.write(warning)
+    with phase("write"):
+        write_output(text, args, appending)
+
+def write_output(text, args, appending):
+    if not appending:
+        print(text)
+        return
+
+    md = text
+    if args.dry_run:
+        print(f"--- would append to {args.outfile} ---\n{md}")
+        return
+    try:
+        with open(args.outfile, "a", encoding="utf-8") as fh:
+            fh.write("\n" + md + "\n")
+        print(f"[ok] appended entries to {args.outfile}")
+    except Exception as e:
+        sys.stderr.write(f"[err] could not append: {e}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Behaviour checks for the ledger tag scraper, run against throwaway trees:
+
+    python -m unittest -v test_scrape_tags      (from regex/)
+"""
+
+import json, os, pathlib, socket, sqlite3, subprocess, sys, tempfile, time, unittest
+import urllib.request
+
+HERE = pathlib.Path(__file__).resolve().parent
+SCRAPER = HERE / "scrape_tags.py"
+
+LEDGER = """\\begin{{SectionHeaderLedger}}{{{title}}}
+\\Tag[ONTO]{{{tag}}} 2025-08-09 v1.0.4 — {note}
+\\end{{SectionHeaderLedger}}
+"""
+
+class ScraperTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+        self.root = self.dir / "tex"
+        self.root.mkdir()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, tag, note, title="Intro"):
+        path = self.root / name
+        path.write_text(LEDGER.format(title=title, tag=tag, note=note), encoding="utf-8")
+        return path
+
+    def scrape(self, *argv, returncode=0):
+        """Run the CLI in the temp dir; returns the finished process."""
+        proc = subprocess.run([sys.executable, str(SCRAPER), *argv], cwd=self.dir,
+                              capture_output=True, text=True)
+        self.assertEqual(proc.returncode, returncode, proc.stderr)
+        return proc
+
+    def tags(self, *argv):
+        """Tags of the entries the CLI prints as JSON for argv."""
+        return [e["tag"] for e in json.loads(self.scrape("--json", "raw", *argv).stdout)]
+
+class CacheTest(ScraperTest):
+    def cached_run(self):
+        """(files scanned, files served from the cache, tags) for a --cache run."""
+        out = self.scrape("--root", "tex", "--json", "raw", "--cache", "cache", "--metrics-out", "m.prom").stdout
+        metrics = dict(ln.rsplit(" ", 1) for ln in (self.dir / "m.prom").read_text().splitlines()
+                       if ln.startswith(("scrape_tags_files_scanned ", "scrape_tags_files_cached ")))
+        return (int(metrics["scrape_tags_files_scanned"]), int(metrics["scrape_tags_files_cached"]),
+                [e["tag"] for e in json.loads(out)])
+
+    def test_hit_until_the_file_changes(self):
+        path = self.write("a.tex", "SEED", "Declared scope.")
+        self.assertEqual(self.cached_run(), (1, 0, ["SEED"]))
+        self.assertEqual(self.cached_run(), (0, 1, ["SEED"]))
+        os.utime(path)   # touched, same content: still a hit
+        self.assertEqual(self.cached_run(), (0, 1, ["SEED"]))
+        mtime = path.stat().st_mtime_ns
+        self.write("a.tex", "CORE", "Declared scope.")   # same size, new content
+        os.utime(path, ns=(mtime + 10**9, mtime + 10**9))  # even on coarse-mtime filesystems
+        self.assertEqual(self.cached_run(), (1, 0, ["CORE"]))
+        self.write("a.tex", "ARC", "A longer note than before.")
+        self.assertEqual(self.cached_run(), (1, 0, ["ARC"]))
+
+class SnapshotTest(ScraperTest):
+    def test_take_then_diff(self):
+        self.write("a.tex", "SEED", "Declared scope.")
+        self.scrape("snapshot", "--store", "store", "take", "--root", "tex", "--ts", "20250101T000000Z")
+        self.write("a.tex", "ARC", "Opened the arc.")
+        self.scrape("snapshot", "--store", "store", "take", "--root", "tex", "--ts", "20250102T000000Z")
+        out = self.scrape("diff", "@20250101T000000Z", "@20250102T000000Z", "--store", "store",
+                          "--format", "json", returncode=1).stdout
+        changes = json.loads(out)
+        self.assertEqual([e["tag"] for e in changes["added"]], ["ARC"])
+        self.assertEqual([e["tag"] for e in changes["removed"]], ["SEED"])
+        restored = json.loads(self.scrape("snapshot", "--store", "store", "restore",
+                                          "--at", "20250101T000000Z").stdout)
+        self.assertEqual([e["tag"] for e in restored], ["SEED"])
+
+class EngramTest(ScraperTest):
+    def rows(self, db):
+        with sqlite3.connect(db) as con:
+            entries = con.execute("SELECT file, tag FROM entries ORDER BY tag").fetchall()
+            postings = con.execute("SELECT count(*) FROM postings WHERE id NOT IN "
+                                   "(SELECT id FROM entries)").fetchone()[0]
+        return entries, postings
+
+    def test_rescan_drops_deleted_file(self):
+        self.write("a.tex", "SEED", "Declared scope.")
+        gone = self.write("b.tex", "ARC", "Opened the arc.")
+        self.scrape("--root", "tex", "--db", "engram.sqlite")
+        entries, _ = self.rows(self.dir / "engram.sqlite")
+        self.assertEqual([tag for _, tag in entries], ["ARC", "SEED"])
+
+        gone.unlink()
+        self.scrape("--root", "tex", "--db", "engram.sqlite")
+        entries, orphans = self.rows(self.dir / "engram.sqlite")
+        self.assertEqual(entries, [(os.path.join("tex", "a.tex"), "SEED")])
+        self.assertEqual(orphans, 0)
+
+    def test_search_ignores_deleted_file(self):
+        self.write("a.tex", "SEED", "Declared drift scope.")
+        self.write("b.tex", "FLOW", "Drift beat.")
+        gone = self.write("c.tex", "ARC", "Drift arc drift.")
+        self.scrape("--root", "tex", "--db", "old.sqlite")
+        gone.unlink()
+        self.scrape("--root", "tex", "--db", "old.sqlite")
+        self.scrape("--root", "tex", "--db", "new.sqlite")
+        rescanned = self.scrape("search", "drift", "--db", "old.sqlite", "--json", "raw").stdout
+        fresh = self.scrape("search", "drift", "--db", "new.sqlite", "--json", "raw").stdout
+        self.assertNotIn("ARC", rescanned)
+        self.assertEqual(rescanned, fresh)
+
+    def test_filtered_rescan_keeps_rows(self):
+        self.write("a.tex", "SEED", "Declared scope.")
+        self.write("b.tex", "ARC", "Opened the arc.")
+        self.scrape("--root", "tex", "--db", "engram.sqlite")
+        self.scrape("--root", "tex", "--db", "engram.sqlite", "--tag", "SEED")
+        entries, _ = self.rows(self.dir / "engram.sqlite")
+        self.assertEqual([tag for _, tag in entries], ["ARC", "SEED"])
+
+class FilterTest(ScraperTest):
+    def test_partial_versions_and_short_dates(self):
+        self.write("a.tex", "SEED", "Declared scope.")
+        self.assertEqual(self.tags("--root", "tex", "--ver-range", "1.0"), ["SEED"])
+        self.assertEqual(self.tags("--root", "tex", "--ver-range", ":1"), ["SEED"])
+        self.assertEqual(self.tags("--root", "tex", "--ver-range", "1.1"), [])
+        self.assertEqual(self.tags("--root", "tex", "--since", "2025-8-9"), ["SEED"])
+
+    def test_bad_filters_are_rejected(self):
+        for argv in (["--ver-range", "x"], ["--ver-range", "1.0.9:1.0.4"],
+                     ["--since", "2025-02-30"], ["--until", "soon"]):
+            err = self.scrape("--root", "tex", *argv, returncode=2).stderr
+            self.assertIn(f"argument {argv[0]}:", err)
+            self.assertNotIn("Traceback", err)
+
+class StagedTest(ScraperTest):
+    def test_outside_git_repository(self):
+        env = dict(os.environ, GIT_CEILING_DIRECTORIES=str(self.dir.parent))
+        for argv in (["--staged", "--json", "raw"], ["--staged", "--check"]):
+            proc = subprocess.run([sys.executable, str(SCRAPER), "--root", "tex", *argv], cwd=self.dir,
+                                  capture_output=True, text=True, env=env)
+            self.assertEqual((proc.returncode, proc.stderr), (2, "[err] --staged: not a git repository\n"))
+
+    def test_check_from_a_subdirectory(self):
+        subprocess.run(["git", "init", "-q"], cwd=self.dir, check=True)
+        self.write("a.tex", "BOGUS", "Not in the registry.")
+        subprocess.run(["git", "add", "tex/a.tex"], cwd=self.dir, check=True)
+        sub = self.dir / "sub"
+        sub.mkdir()
+        proc = subprocess.run([sys.executable, str(SCRAPER), "--staged", "--check", "--root", "../tex"],
+                              cwd=sub, capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 1, proc.stderr)
+        self.assertIn("../tex/a.tex:2:1: error: unknown tag 'BOGUS'", proc.stdout)
+
+class ChangelogTest(ScraperTest):
+    def write_ledger(self, name, *tags):
+        lines = [f"\\Tag[ONTO]{{{tag}}} {date} v{ver} — {tag.lower()} note." for tag, date, ver in tags]
+        (self.root / name).write_text("\\begin{SectionHeaderLedger}{Intro}\n" + "\n".join(lines)
+                                      + "\n\\end{SectionHeaderLedger}\n", encoding="utf-8")
+
+    def incremental(self, *argv):
+        return self.scrape("--root", "tex", "--mode", "incremental", "--outfile", "CHANGELOG.md", *argv).stdout
+
+    def test_rerun_adds_nothing(self):
+        self.write_ledger("a.tex", ("SEED", "2025-08-09", "1.0.4"), ("ARC", "2025-08-01", "1.0.3"))
+        self.incremental()
+        first = (self.dir / "CHANGELOG.md").read_text(encoding="utf-8")
+        self.assertIn("no new entries", self.incremental())
+        self.assertEqual((self.dir / "CHANGELOG.md").read_text(encoding="utf-8"), first)
+
+    def test_new_entries_join_their_groups(self):
+        self.write_ledger("a.tex", ("SEED", "2025-08-09", "1.0.4"), ("ARC", "2025-08-01", "1.0.3"))
+        self.incremental()
+        changelog = self.dir / "CHANGELOG.md"
+        inode = changelog.stat().st_ino
+        self.write_ledger("a.tex", ("SEED", "2025-08-09", "1.0.4"), ("ARC", "2025-08-01", "1.0.3"),
+                          ("CORE", "2025-08-01", "1.0.3"))
+        self.assertIn("- **[ONTO:CORE]** (Intro) — core note.", self.incremental("--dry-run"))
+        self.incremental()
+        self.assertEqual(changelog.stat().st_ino, inode)   # last group: written in place, not replaced
+        self.write_ledger("a.tex", ("SEED", "2025-08-09", "1.0.4"), ("FLOW", "2025-08-09", "1.0.4"),
+                          ("ARC", "2025-08-01", "1.0.3"), ("CORE", "2025-08-01", "1.0.3"))
+        self.incremental()
+        groups = [g.strip().splitlines() for g in changelog.read_text(encoding="utf-8").split("---") if g.strip()]
+        self.assertEqual([len(g) for g in groups], [3, 3])
+        self.assertEqual(groups[0][2], "- **[ONTO:FLOW]** (Intro) — flow note.")
+        self.assertEqual(groups[1][2], "- **[ONTO:CORE]** (Intro) — core note.")
+
+class LedgerTest(ScraperTest):
+    def test_non_tex_ledgers_match_the_scrape(self):
+        (self.root / "Makefile").write_text(
+            "all:\n# \\begin{SectionHeaderLedger}\n"
+            "# \\Tag[META]{BUILD} 2025-08-09 v1.0.4 — Make target.\n"
+            "# \\end{SectionHeaderLedger}\n", encoding="utf-8")
+        out = self.scrape("ledger", "--root", "tex", "--formats", "make", "--format", "json").stdout
+        [block] = json.loads(out)
+        self.assertEqual(block["title"], "Makefile")
+        self.assertFalse([ln for ln in block["text"].splitlines() if ln.startswith("#")])
+        entries = json.loads(self.scrape("--root", "tex", "--formats", "make", "--json", "raw").stdout)
+        self.assertEqual([e["section"] for e in entries], [block["title"]])
+
+class DaemonTest(ScraperTest):
+    def serve(self, *argv):
+        sock = self.dir / "d.sock"
+        proc = subprocess.Popen([sys.executable, str(SCRAPER), "--serve", "--socket", str(sock), *argv],
+                                cwd=self.dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.addCleanup(proc.wait)
+        self.addCleanup(proc.terminate)
+        deadline = time.monotonic() + 10
+        while not sock.exists():
+            self.assertIsNone(proc.poll(), "daemon exited")
+            self.assertLess(time.monotonic(), deadline, "daemon did not start")
+            time.sleep(0.05)
+        return str(sock)
+
+    def test_other_root_is_scanned_locally(self):
+        self.write("a.tex", "SEED", "Declared scope.")
+        other = self.dir / "other"
+        other.mkdir()
+        (other / "b.tex").write_text(LEDGER.format(title="Other", tag="ARC", note="Opened the arc."),
+                                     encoding="utf-8")
+        sock = self.serve("--root", "tex")
+        self.assertEqual(self.tags("--socket", sock, "--root", "tex"), ["SEED"])
+        proc = self.scrape("--socket", sock, "--root", "other", "--json", "raw")
+        self.assertEqual([e["tag"] for e in json.loads(proc.stdout)], ["ARC"])
+        self.assertIn("scanning locally", proc.stderr)
+
+    def test_serve_rejects_inputs_it_ignores(self):
+        err = self.scrape("--serve", "--root", "tex", "--from-main", "main.tex", returncode=2).stderr
+        self.assertIn("--from-main", err)
+
+    def test_metrics_endpoint_exposes_counters(self):
+        self.write("a.tex", "SEED", "Declared scope.")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.tags("--socket", self.serve("--root", "tex", "--metrics-port", str(port)), "--root", "tex")
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as resp:
+            body = resp.read().decode("utf-8")
+        self.assertIn("# TYPE scrape_tags_files_scanned_total counter", body)
+        self.assertIn("scrape_tags_tags_matched_total 1", body)
+        self.assertIn("# TYPE scrape_tags_cache_hit_ratio gauge", body)
+
+class DiscoveryTest(ScraperTest):
+    def test_hidden_dirs_skipped_for_every_format_list(self):
+        self.write("a.tex", "SEED", "Declared scope.")
+        for hidden in (".backup", "__pycache__"):
+            (self.root / hidden).mkdir()
+            (self.root / hidden / "b.tex").write_text(
+                LEDGER.format(title="Old", tag="ARC", note="Stale copy."), encoding="utf-8")
+        self.assertEqual(self.tags("--root", "tex"), ["SEED"])
+        self.assertEqual(self.tags("--root", "tex", "--formats", "tex,sty"), ["SEED"])
+
+class AnalyzeTest(ScraperTest):
+    def test_header_and_footer_are_separate_blocks(self):
+        (self.root / "s.tex").write_text(
+            "\\Section{MotherTeal}{MotherGlyph}{Intro}\n"
+            + LEDGER.format(title="Intro", tag="SEED", note="Declared scope.")
+            + "Body text.\n"
+            + "\\begin{SectionFooterLedger}\n"
+              "\\Tag[ONTO]{ARC} 2025-08-09 v1.0.4 — Opened the arc.\n"
+              "\\end{SectionFooterLedger}\n", encoding="utf-8")
+        out = self.scrape("analyze", "--root", "tex", "--matrix", "cooccurrence", "--format", "json").stdout
+        counts = dict(zip(*map(json.loads(out).get, ("rows", "counts"))))
+        self.assertEqual(counts, {"ARC": [1, 0], "SEED": [0, 1]})
+
+if __name__ == "__main__":
+    unittest.main()